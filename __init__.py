@@ -5,30 +5,120 @@ from __future__ import annotations
 import logging
 import asyncio
 
-from .const import DOMAIN, CONF_MESH_NAME, CONF_MESH_PASSWORD, CONF_MESH_KEY
+import voluptuous as vol
+
+from .const import (
+    DOMAIN,
+    CONF_MESH_NAME,
+    CONF_MESH_PASSWORD,
+    CONF_MESH_KEY,
+    CONF_COMMAND_INTERVAL,
+    CONF_GROUPS,
+    CONF_METRICS,
+    CONF_WRITE_WITHOUT_RESPONSE,
+    DATA_CONNECTION_BUDGET,
+    DEFAULT_COMMAND_INTERVAL,
+)
 
 from .awox import AwoxMeshLight
-
+from .connection_budget import AwoxConnectionBudget
+from .effects import AwoxEffectEngine
+from .groups import AwoxGroupProvisioner
+from .inventory import AwoxInventoryReconciler
+from .ota import AwoxFirmwareUpdater
+from .scenes import AwoxSceneManager
+
+from homeassistant.components.event import DOMAIN as EVENT_DOMAIN
+from homeassistant.components.homeassistant.scene import EVENT_SCENE_RELOADED
 from homeassistant.components.light import DOMAIN as LIGHT_DOMAIN
-from homeassistant.core import HomeAssistant
+from homeassistant.components.scene import DOMAIN as SCENE_DOMAIN
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
+from homeassistant.core import Event, HomeAssistant, ServiceCall
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.start import async_at_started
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_DEVICES
 
-from homeassistant.components import bluetooth
-
-PLATFORMS = [LIGHT_DOMAIN]
+PLATFORMS = [EVENT_DOMAIN, LIGHT_DOMAIN, SCENE_DOMAIN, SENSOR_DOMAIN]
 
 _LOGGER = logging.getLogger(DOMAIN)
 
 
+def _meshes(hass: HomeAssistant) -> list[AwoxMeshLight]:
+    """Return the hubs of the loaded entries."""
+    return [mesh for mesh in hass.data[DOMAIN].values() if isinstance(mesh, AwoxMeshLight)]
+
+
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Awox controller/hub specific code."""
 
-    service_infos = bluetooth.async_discovered_service_info(hass, connectable=True)
-    for service_info in service_infos:
-        _LOGGER.info('service_info %s', service_info)
+    # Entry hubs are added by entry id next to the shared connection budget
+    hass.data[DOMAIN] = {DATA_CONNECTION_BUDGET: AwoxConnectionBudget()}
+
+    async def async_refresh_devices(call: ServiceCall) -> None:
+        """Sync every entry's devices with the AwoX cloud now."""
+        for mesh in _meshes(hass):
+            if mesh.reconciler is not None:
+                await mesh.reconciler.async_reconcile(force=True)
+
+    hass.services.async_register(DOMAIN, "refresh_devices", async_refresh_devices)
+
+    updater = AwoxFirmwareUpdater(hass)
+
+    async def async_check_all(call: ServiceCall) -> None:
+        """Report the devices with a newer local firmware image."""
+        await updater.async_check_all(_meshes(hass))
+
+    async def async_update_all(call: ServiceCall) -> None:
+        """Flash every device with a newer local firmware image."""
+        await updater.async_update_all(
+            _meshes(hass), call.data.get("max_connections")
+        )
+
+    async def async_install(call: ServiceCall) -> None:
+        """Flash one device, by mesh id."""
+        for mesh in _meshes(hass):
+            for device in mesh.devices:
+                if device["mesh_id"] == call.data["mesh_id"]:
+                    await updater.async_install(mesh, device, call.data.get("file"))
+                    return
+        _LOGGER.warning("No AwoX device with mesh id %s", call.data["mesh_id"])
+
+    async def async_sync_scenes(call: ServiceCall) -> None:
+        """Save Home Assistant scenes in the lights' scene slots."""
+        for mesh in _meshes(hass):
+            await mesh.scenes.async_sync(call.data.get("entity_id"), call.data["force"])
+
+    hass.services.async_register(
+        DOMAIN,
+        "sync_scenes",
+        async_sync_scenes,
+        schema=vol.Schema({
+            vol.Optional("entity_id"): cv.entity_ids,
+            vol.Optional("force", default=False): cv.boolean,
+        }),
+    )
+
+    hass.services.async_register(DOMAIN, "check_all", async_check_all)
+    hass.services.async_register(
+        DOMAIN,
+        "update_all",
+        async_update_all,
+        schema=vol.Schema({
+            vol.Optional("max_connections"): vol.All(vol.Coerce(int), vol.Range(min=1, max=5)),
+        }),
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "install",
+        async_install,
+        schema=vol.Schema({
+            vol.Required("mesh_id"): cv.positive_int,
+            vol.Optional("file"): cv.isfile,
+        }),
+    )
 
-    hass.data[DOMAIN] = {}
     # Return boolean to indicate that initialization was successfully.
     return True
 
@@ -37,16 +127,70 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     _LOGGER.info('setup config flow entry %s', entry.data)
 
-    mesh = AwoxMeshLight(hass, entry.data[CONF_MESH_NAME], entry.data[CONF_MESH_PASSWORD], entry.data[CONF_MESH_KEY])
+    mesh = AwoxMeshLight(
+        hass,
+        entry.data[CONF_MESH_NAME],
+        entry.data[CONF_MESH_PASSWORD],
+        entry.data[CONF_MESH_KEY],
+        entry.data.get(CONF_DEVICES, []),
+        entry.options.get(CONF_COMMAND_INTERVAL, DEFAULT_COMMAND_INTERVAL),
+    )
+    mesh.write_without_response = entry.options.get(CONF_WRITE_WITHOUT_RESPONSE, False)
+    mesh.metrics.enabled = entry.options.get(CONF_METRICS, False)
+
+    mesh.effects = AwoxEffectEngine(hass, mesh)
+    mesh.connection_budget = hass.data[DOMAIN][DATA_CONNECTION_BUDGET]
+    mesh.async_update_groups(entry.data.get(CONF_GROUPS, []))
+
+    mesh.scenes = AwoxSceneManager(hass, entry, mesh)
+    await mesh.scenes.async_load()
 
     # Make `mesh` accessible for all platforms
     hass.data[DOMAIN][entry.entry_id] = mesh
 
+    # Follow advertisements of the configured nodes
+    mesh.async_start()
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+
+    # Rooms of the AwoX app become mesh groups, one packet per room. Nodes
+    # out of reach join once they are heard again
+    mesh.provisioner = AwoxGroupProvisioner(hass, entry, mesh)
+    mesh.provisioner.async_start()
+    entry.async_on_unload(mesh.provisioner.async_stop)
+
+    # Pick up lights added in the AwoX app without reloading the entry
+    mesh.reconciler = AwoxInventoryReconciler(hass, entry, mesh)
+    mesh.reconciler.async_start()
+    entry.async_on_unload(mesh.reconciler.async_stop)
+
+    # Saved scenes follow the scene configuration, only changes are written.
+    # Once per start every slot is written again, repairing missed writes
+    async def async_rewrite_scenes(_: HomeAssistant) -> None:
+        await mesh.scenes.async_sync(force=True)
+
+    async def async_sync_scenes(_: Event) -> None:
+        await mesh.scenes.async_sync()
+
+    entry.async_on_unload(async_at_started(hass, async_rewrite_scenes))
+    entry.async_on_unload(hass.bus.async_listen(EVENT_SCENE_RELOADED, async_sync_scenes))
+
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options to the running hub without a reload."""
+    mesh = hass.data[DOMAIN].get(entry.entry_id)
+    if mesh is None:
+        return
+
+    mesh.command_interval = entry.options.get(CONF_COMMAND_INTERVAL, DEFAULT_COMMAND_INTERVAL)
+    mesh.write_without_response = entry.options.get(CONF_WRITE_WITHOUT_RESPONSE, False)
+    mesh.metrics.enabled = entry.options.get(CONF_METRICS, False)
+
+
 async def async_unload_entry(hass, entry) -> bool:
     """Unload a config entry."""
     _LOGGER.info("Unload entry %s", entry.entry_id)
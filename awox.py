@@ -1,62 +1,193 @@
-import asyncio
-import struct
-
-from os import urandom
+from __future__ import annotations
 
-from Crypto.Cipher import AES
-
-from bleak import BleakClient, BleakScanner
-
-from homeassistant.components.bluetooth import async_ble_device_from_address
-from homeassistant.components.bluetooth import async_get_scanner
-from habluetooth import BluetoothServiceInfoBleak
-from bleak_retry_connector import establish_connection
+import asyncio
+import time
 
+from datetime import timedelta
 
-from bleak.backends.characteristic import BleakGATTCharacteristic
+from os import urandom
+from typing import TYPE_CHECKING
 
 import logging
 
 _LOGGER = logging.getLogger("awox")
 
-from .const import DOMAIN, CONF_MESH_NAME, CONF_MESH_KEY
+from .const import DEFAULT_COMMAND_INTERVAL
+from .connection_budget import PRIORITY_BACKGROUND, PRIORITY_STANDBY, PRIORITY_USER, adapter_of
+from .metrics import AwoxMetrics
+from .protocol import (
+    ACKED_COMMANDS,
+    BROADCAST_MESH_ID,
+    C_GET_STATUS_SENT,
+    COMMAND_CHAR_UUID,
+    GROUP_ADDRESS_FLAG,
+    NODE_EDIT_COMMANDS,
+    PAIR_CHAR_UUID,
+    STATUS_CHAR_UUID,
+    AwoxSessionCrypto,
+    make_command_packet,
+    make_pair_packet,
+    make_session_key,
+    parse_remote_packet,
+    parse_status_packet,
+    status_confirms,
+)
 
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
 
 
 from homeassistant.components import bluetooth
 
-PAIR_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1914'
-COMMAND_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1912'
-STATUS_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1911'
-OTA_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1913'
-SERV_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1913'
-
-C_POWER = 0xd0
+if TYPE_CHECKING:
+    from bleak import BleakClient
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+    from habluetooth import BluetoothServiceInfoBleak
+
+# Seconds to wait for the status confirming a command, and how many times
+# an unconfirmed command is sent again
+ACK_TIMEOUT = 0.5
+ACK_RETRIES = 2
+
+# Seconds without an advertisement or a status report before a node is
+# considered gone
+PRESENCE_TIMEOUT = 300
+PRESENCE_REFRESH_INTERVAL = timedelta(seconds=60)
+
+# Upper bound for finding a new gateway after the link drops, and for
+# connecting to and pairing with one candidate, so a dead node cannot use
+# up the whole failover
+FAILOVER_TIMEOUT = 30
+GATEWAY_CONNECT_TIMEOUT = 10
+
+# Score points per unit of connection success rate, against RSSI in dBm
+SUCCESS_RATE_WEIGHT = 30
+
+# Bounds, in seconds, of the wait for a freshly paired node to answer. The
+# wait adapts to each node, READY_TIMEOUT is used until it answered once.
+READY_TIMEOUT = 2.0
+READY_TIMEOUT_MIN = 0.25
+# Margin over a node's usual answer time before falling back to a readback
+READY_TIMEOUT_FACTOR = 3
+# Weight of the newest sample in a node's answer time average
+READY_SMOOTHING = 0.3
+
+# Seconds between two reconnects started by advertisements of a node
+PREWARM_COOLDOWN = 30
+
+# A session holds its connection slot as a user connection while it wrote
+# in the last SESSION_BUSY_TIME seconds, then as a background one, which a
+# user command of another entry on the same adapter may take over
+SESSION_BUSY_TIME = 5
+
+# A standby link to a second node is kept during the hours of the day that
+# saw at least BUSY_HOUR_SHARE of the busiest hour's commands, and at least
+# BUSY_HOUR_MIN_COMMANDS, until no command came for STANDBY_IDLE_TIMEOUT
+BUSY_HOUR_SHARE = 0.5
+BUSY_HOUR_MIN_COMMANDS = 5
+STANDBY_IDLE_TIMEOUT = 600
+STANDBY_CHECK_INTERVAL = timedelta(seconds=60)
+# Daily decay of the command counts per hour, old habits fade in a week
+USAGE_DECAY = 0.8
+
+async def connect_bleak_client (ble_device, disconnected_callback):
+    """Open a BLE connection to a mesh node with bleak_retry_connector."""
+    # Transport libraries load with the first connection, not with the integration
+    from bleak import BleakClient
+    from bleak_retry_connector import establish_connection
+
+    return await establish_connection(
+        BleakClient,
+        ble_device,
+        ble_device.address,
+        disconnected_callback=disconnected_callback,
+        max_attempts=1,
+        timeout=GATEWAY_CONNECT_TIMEOUT,
+    )
 
 
 class AwoxMeshLight:
-    def __init__ (self, hass: HomeAssistant, mesh_name: str, mesh_password: str, mesh_long_term_key: str):
+    def __init__ (self, hass: HomeAssistant, mesh_name: str, mesh_password: str, mesh_long_term_key: str, devices: list | None = None, command_interval: float = DEFAULT_COMMAND_INTERVAL, connector = None):
         """
         Args :
-            mac: The light's MAC address as a string in the form AA:BB:CC:DD:EE:FF
             mesh_name: The mesh name as a string.
             mesh_password: The mesh password as a string.
+            devices: The configured devices, any light among them can act
+                as the gateway node that relays commands to the others.
+            command_interval: Minimum time between two packets, in seconds.
+            connector: Coroutine function (ble_device, disconnected_callback)
+                returning a connected client, establish_connection by default.
         """
      
 
         _LOGGER.info("Starting Awox lights control")
         
-        self.mac = "A4:C1:38:77:2A:18"
+        # MAC of the node currently relaying for the mesh
+        self.mac = None
         self.mesh_id = 0
 
         self._mesh_name = mesh_name
         self.mesh_password = mesh_password
         self.mesh_long_term_key = mesh_long_term_key
+        self._devices = devices or []
+
+        # Presence index of the configured nodes, kept current from
+        # advertisements and status reports
+        self._nodes_by_mac: dict[str, MeshNode] = {}
+        self._nodes_by_mesh_id: dict[int, MeshNode] = {}
+        for device in self._devices:
+            self._add_node(device)
+        self._presence_listeners: dict[int, list] = {}
+        self._device_listeners: list = []
+        self._unsubscribes: list = []
+        self._node_unsubscribes: dict[str, list] = {}
+        self._started = False
+
+        # Nodes busy with their own connection, e.g. a firmware update
+        self._released: set[str] = set()
 
         self.session_key = None
         self.command_char = None
 
+        self.hass = hass
+        self.connector = connector or connect_bleak_client
+        self.metrics = AwoxMetrics()
+        self._session = AwoxMeshSession(self)
+
+        # Paired link to a second node, ready to take over when the
+        # session drops during busy hours
+        self._standby: AwoxMeshSession | None = None
+        self._standby_task: asyncio.Task | None = None
+        # User commands per hour of the day, and the time of the last one
+        self._usage = [0.0] * 24
+        self._usage_day = None
+        self._last_command: float | None = None
+
+        # Commands waiting to be sent, keyed by (dest_id, command) so a newer
+        # value for the same light and attribute replaces the older one
+        self._pending: dict[tuple[int, int], _PendingCommand] = {}
+        self._pending_event = asyncio.Event()
+        self._queue_task: asyncio.Task | None = None
+        self.command_interval = command_interval
+
+        # Write packets without response and confirm them through the
+        # status notifications of the lights instead
+        self.write_without_response = False
+        self._deliveries: list[_Delivery] = []
+
+        # Mesh group address -> mesh ids of its provisioned members
+        self._groups: dict[int, set[int]] = {}
+        self.group_entries: list[dict] = []
+        self._group_listeners: list = []
+
+        # Last decoded status per mesh id and the entities listening for it
+        self.statuses: dict[int, dict] = {}
+        self._status_listeners: dict[int, list] = {}
+
+        # Entities listening for the button presses of a remote, by mesh id
+        self._remote_listeners: dict[int, list] = {}
+
 
         # Light status
         self.white_brightness = None
@@ -72,216 +203,1431 @@ class AwoxMeshLight:
         self.connected = None
         self.brightness = None
 
+        # Times the session moved to another gateway after losing one
+        self.failovers = 0
+
+        # Cloud inventory sync, set up by the integration
+        self.reconciler = None
+
+        # Mesh group provisioning, set up by the integration
+        self.provisioner = None
+
+        # Transitions and effects, set up by the integration
+        self.effects = None
+
+        # Scenes saved on the nodes, set up by the integration
+        self.scenes = None
+
+        # BLE connections shared with the other entries, set up by the
+        # integration, unlimited without
+        self.connection_budget = None
+
         self._attr_device_info = ...  # For automatic device registration
         self._attr_unique_id = ...
 
-    async def async_shutdown(self):
-        """Clean shutdown for Home Assistant unload."""
-        return
+    def _add_node(self, device: dict) -> MeshNode:
+        node = MeshNode(device["mac"].upper(), device["mesh_id"], "light" in device.get("type", ""))
+        self._nodes_by_mac[node.mac] = node
+        self._nodes_by_mesh_id[node.mesh_id] = node
+        return node
+
+    def _async_track_node(self, node: MeshNode) -> None:
+        """Follow the advertisements of one node."""
+        service_info = bluetooth.async_last_service_info(self.hass, node.mac, connectable=True)
+        if service_info is not None:
+            node.update_from_advertisement(service_info)
+
+        self._node_unsubscribes[node.mac] = [
+            bluetooth.async_register_callback(
+                self.hass,
+                self._async_on_advertisement,
+                bluetooth.BluetoothCallbackMatcher(address=node.mac, connectable=True),
+                bluetooth.BluetoothScanningMode.PASSIVE,
+            ),
+            bluetooth.async_track_unavailable(
+                self.hass, self._async_on_unavailable, node.mac, connectable=True
+            ),
+        ]
+
+    def _async_untrack_node(self, node: MeshNode) -> None:
+        for unsubscribe in self._node_unsubscribes.pop(node.mac, ()):
+            unsubscribe()
+
+    def async_start(self) -> None:
+        """Start following the advertisements of the configured nodes."""
+        self._started = True
+        for node in self._nodes_by_mac.values():
+            self._async_track_node(node)
+
+        # Status based presence expires without any callback, recheck it
+        self._unsubscribes.append(
+            async_track_time_interval(self.hass, self._async_refresh_presence, PRESENCE_REFRESH_INTERVAL)
+        )
+        self._unsubscribes.append(
+            async_track_time_interval(self.hass, self._async_check_standby, STANDBY_CHECK_INTERVAL)
+        )
+
+        # Connect once so status reports start flowing without a command
+        self.hass.async_create_background_task(
+            self._session.async_ensure_connected(PRIORITY_BACKGROUND), "awox initial connect"
+        )
+
+    def _async_on_advertisement(
+        self, service_info: BluetoothServiceInfoBleak, change: bluetooth.BluetoothChange
+    ) -> None:
+        """Record an advertisement of a configured node."""
+        node = self._nodes_by_mac.get(service_info.address.upper())
+        if node is None:
+            return
+
+        was_available = self.is_available(node.mesh_id)
+        node.update_from_advertisement(service_info)
+        if not was_available:
+            self._notify_presence(node.mesh_id)
+
+        # A gateway is back in range, pair now rather than on the next command
+        if node.is_light and node.mac not in self._released:
+            self._session.async_prewarm()
+
+    def _async_on_unavailable(self, service_info: BluetoothServiceInfoBleak) -> None:
+        """Forget the radio link of a node that stopped advertising."""
+        node = self._nodes_by_mac.get(service_info.address.upper())
+        if node is None:
+            return
+
+        node.ble_device = None
+        node.last_advertisement = None
+        self._notify_presence(node.mesh_id)
+
+    def _async_refresh_presence(self, now=None) -> None:
+        for mesh_id in self._presence_listeners:
+            self._notify_presence(mesh_id)
+
+    def async_update_devices(self, devices: list) -> None:
+        """Swap in a new device list while the session keeps running.
+
+        Nodes no longer listed leave the presence index, so their entities
+        turn unavailable; new ones are indexed and announced to the device
+        listeners, which add their entities.
+        """
+        wanted = {(device["mac"].upper(), device["mesh_id"]) for device in devices}
 
-        
+        for node in list(self._nodes_by_mac.values()):
+            if (node.mac, node.mesh_id) in wanted:
+                continue
+            self._async_untrack_node(node)
+            del self._nodes_by_mac[node.mac]
+            if self._nodes_by_mesh_id.get(node.mesh_id) is node:
+                del self._nodes_by_mesh_id[node.mesh_id]
+            self._notify_presence(node.mesh_id)
 
-    @staticmethod
-    def encrypt (key, value):
-        assert (len(key) == 16)
-        k = bytearray (key)
-        val = bytearray(value.ljust (16, b'\x00'))
-        k.reverse ()
-        val.reverse ()
-        cipher = AES.new(bytes(k), AES.MODE_ECB)
-        
-        val = bytearray(cipher.encrypt(bytes(val)))
-        val.reverse ()
+        for device in devices:
+            if device["mac"].upper() in self._nodes_by_mac:
+                continue
+            node = self._add_node(device)
+            if self._started:
+                self._async_track_node(node)
 
-        return val
+        self._devices = devices
 
-    
-    @staticmethod
-    def make_checksum (key, nonce, payload):
+        for listener in list(self._device_listeners):
+            listener(devices)
+
+    def async_subscribe_devices(self, listener) -> callable:
+        """Call listener with the device list whenever it changes.
+
+        Returns a function that removes the listener.
         """
-        Args :
-            key: Encryption key, 16 bytes
-            nonce:
-            payload: The unencrypted payload.
+        self._device_listeners.append(listener)
+
+        def unsubscribe() -> None:
+            self._device_listeners.remove(listener)
+
+        return unsubscribe
+
+    def async_update_groups(self, groups: list[dict]) -> None:
+        """Use the mesh groups of the entry, as provisioned on the nodes.
+
+        Packets only go to a group address once its members are
+        provisioned; group listeners are told about every change.
         """
-        base = nonce + bytearray ([len(payload)])
-        base = base.ljust (16, b'\x00')
-        check =  AwoxMeshLight.encrypt (key, base)
+        self._groups = {
+            group["address"]: set(group["provisioned"])
+            for group in groups
+            if group["provisioned"]
+        }
+        self.group_entries = groups
 
-        for i in range (0, len (payload), 16):
-            check_payload = bytearray (payload[i:i+16].ljust (16, b'\x00'))
-            check = bytearray([ a ^ b for (a,b) in zip(check, check_payload) ])
-            check =  AwoxMeshLight.encrypt (key, check)
+        for listener in list(self._group_listeners):
+            listener(groups)
 
-        return check
-    
+    def group_members(self, address: int) -> set[int]:
+        """Return the mesh ids provisioned in a group."""
+        return set(self._groups.get(address, ()))
 
-    @staticmethod
-    def make_session_key (mesh_name, mesh_password, session_random, response_random):
-        random = session_random + response_random
-        m_n = bytearray (mesh_name.ljust (16, b'\x00'))
-        m_p = bytearray (mesh_password.ljust (16, b'\x00'))
-        name_pass = bytearray([ a ^ b for (a,b) in zip(m_n, m_p) ])
-        key = AwoxMeshLight.encrypt (name_pass, random)
-        return key
+    def async_subscribe_groups(self, listener) -> callable:
+        """Call listener with the group list whenever it changes.
 
-    @staticmethod
-    def crypt_payload (key, nonce, payload):
+        Returns a function that removes the listener.
         """
-        Used for both encrypting and decrypting.
+        self._group_listeners.append(listener)
+
+        def unsubscribe() -> None:
+            self._group_listeners.remove(listener)
+
+        return unsubscribe
+
+    def node(self, mesh_id: int) -> MeshNode | None:
+        """Return the presence index entry of a mesh id."""
+        return self._nodes_by_mesh_id.get(mesh_id)
+
+    def is_available(self, mesh_id: int) -> bool:
+        """Return True when the node was heard recently, directly or through the mesh."""
+        node = self._nodes_by_mesh_id.get(mesh_id)
+        if node is None:
+            return False
 
+        # Nodes stop advertising while a session is connected to them
+        for session in (self._session, self._standby):
+            if session is not None and session.is_connected and node.mac == session.address.upper():
+                return True
+
+        return node.last_seen is not None and time.monotonic() - node.last_seen < PRESENCE_TIMEOUT
+
+    def async_subscribe_presence(self, mesh_id: int, listener) -> callable:
+        """Call listener when the availability of mesh_id may have changed.
+
+        Returns a function that removes the listener.
         """
-        base = bytearray(b'\x00' + nonce)
-        base = base.ljust (16, b'\x00')
-        result = bytearray ()
+        listeners = self._presence_listeners.setdefault(mesh_id, [])
+        listeners.append(listener)
 
-        for i in range (0, len (payload), 16):
-            enc_base = AwoxMeshLight.encrypt (key, base)
-            result += bytearray ([ a ^ b for (a,b) in zip (enc_base, bytearray (payload[i:i+16]))])
-            base[0] += 1
+        def unsubscribe() -> None:
+            listeners.remove(listener)
 
-        return result
+        return unsubscribe
 
+    def notify_gateway_changed(self) -> None:
+        """Refresh the availability of the gateway node, which stops advertising while connected."""
+        if self.mesh_id in self._nodes_by_mesh_id:
+            self._notify_presence(self.mesh_id)
 
-    @staticmethod
-    def make_command_packet (key, address, dest_id, command, data):
+    def _notify_presence(self, mesh_id: int) -> None:
+        for listener in list(self._presence_listeners.get(mesh_id, ())):
+            listener()
+
+    async def async_shutdown(self):
+        """Clean shutdown for Home Assistant unload."""
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        self._unsubscribes.clear()
+        for node in list(self._nodes_by_mac.values()):
+            self._async_untrack_node(node)
+
+        if self.effects is not None:
+            self.effects.stop()
+
+        if self._queue_task is not None:
+            self._queue_task.cancel()
+            self._queue_task = None
+
+        for pending in self._pending.values():
+            pending.resolve(False)
+        self._pending.clear()
+
+        for delivery in self._deliveries:
+            delivery.cancel()
+        self._deliveries.clear()
+
+        if self._standby_task is not None:
+            self._standby_task.cancel()
+            self._standby_task = None
+        if self._standby is not None:
+            await self._standby.async_close()
+            self._standby = None
+
+        await self._session.async_close()
+
+    @property
+    def devices(self) -> list:
+        """Return the configured devices."""
+        return self._devices
+
+    async def async_release_node(self, mac: str) -> None:
+        """Keep the session off a node, dropping the link if it is the gateway."""
+        self._released.add(mac.upper())
+        if self._standby is not None and (self._standby.address or "").upper() == mac.upper():
+            await self._async_stop_standby()
+        if self._session.address and self._session.address.upper() == mac.upper():
+            await self._session.async_disconnect()
+
+    def restore_node(self, mac: str) -> None:
+        """Let the session use a released node again."""
+        self._released.discard(mac.upper())
+
+    def gateway_candidates(self, session: AwoxMeshSession | None = None) -> list:
+        """Return the BLE devices of advertising lights, best gateway first.
+
+        Nodes are ranked by their last RSSI plus a bonus for their
+        connection success rate, so a close node that keeps dropping the
+        link loses to a slightly weaker but stable one. The node the other
+        session of the hub is connected to is left out for session.
         """
-        Args :
-            key: The encryption key, 16 bytes.
-            address: The mac address as a string.
-            dest_id: The mesh id of the command destination as a number.
-            command: The command as a number.
-            data: The parameters for the command as bytes.
+        busy = {
+            other.address.upper()
+            for other in (self._session, self._standby)
+            if other is not None and other is not session and other.address
+        }
+        nodes = [
+            node
+            for node in self._nodes_by_mac.values()
+            if node.is_light
+            and node.ble_device is not None
+            and node.mac not in self._released
+            and node.mac not in busy
+        ]
+        # A node that failed or dropped goes last until it advertises again,
+        # its BLE device outlives it until the unavailable tracker fires
+        nodes.sort(key=lambda node: (not node.stale, node.gateway_score), reverse=True)
+        return [node.ble_device for node in nodes]
+
+    def record_connection(self, mac: str, success: bool) -> None:
+        """Count a connection attempt, or a dropped link, to a node."""
+        node = self._nodes_by_mac.get(mac.upper())
+        if node is None:
+            return
+
+        node.connect_attempts += 1
+        if success:
+            node.connect_successes += 1
+        else:
+            node.stale = True
+
+    def ready_timeout(self, mac: str) -> float:
+        """Return how long to wait for a freshly paired node to answer."""
+        node = self._nodes_by_mac.get(mac.upper())
+        if node is None or node.ready_delay is None:
+            return READY_TIMEOUT
+        return min(max(node.ready_delay * READY_TIMEOUT_FACTOR, READY_TIMEOUT_MIN), READY_TIMEOUT)
+
+    def record_ready_delay(self, mac: str, delay: float) -> None:
+        """Fold the time a paired node took to answer into its average."""
+        node = self._nodes_by_mac.get(mac.upper())
+        if node is None:
+            return
+
+        if node.ready_delay is None:
+            node.ready_delay = delay
+        else:
+            node.ready_delay += READY_SMOOTHING * (delay - node.ready_delay)
+
+    def is_primary(self, session: AwoxMeshSession) -> bool:
+        """Return True for the session commands go through."""
+        return session is self._session
+
+    def promote_standby(self) -> bool:
+        """Make the standby link the session, after the session dropped.
+
+        Returns False when there is no paired standby to take over.
         """
-        # Sequence number, just need to be different, idea from https://github.com/nkaminski/csrmesh
-        s  = urandom (3)
-
-        # Build nonce
-        a = bytearray.fromhex(address.replace (":",""))
-        #print("a :: ", a)
-        a.reverse()
-        #print("a :: ", a)
-        nonce = bytes(a[0:4] + b'\x01' + s)
-
-        # Build payload
-        dest = struct.pack ("<H", dest_id)
-        payload = (dest + struct.pack('B', command) + b'\x60\x01' + data).ljust(15, b'\x00')
-
-        # Compute checksum
-        check = AwoxMeshLight.make_checksum (key, nonce, payload)
-
-        # Encrypt payload
-        payload = AwoxMeshLight.crypt_payload (key, nonce, payload)
-
-        #print("payload :: ", payload)
-        #print("check :: ", check)
-        #print("s :: ", s)
-        # Make packet
-        packet = s + check[0:2] + payload
-        #print("packet :: ", packet)
-        return packet
-    
-    @staticmethod
-    def make_pair_packet (mesh_name, mesh_password, session_random):
-        m_n = bytearray (mesh_name.ljust (16, b'\x00'))
-        m_p = bytearray (mesh_password.ljust (16, b'\x00'))
-        s_r = session_random.ljust (16, b'\x00')
-        name_pass = bytearray ([ a ^ b for (a,b) in zip(m_n, m_p) ])
-        enc = AwoxMeshLight.encrypt (s_r ,name_pass)
-        packet = bytearray(b'\x0c' + session_random) # 8bytes session_random
-        packet += enc[0:8]
-        return packet
+        standby = self._standby
+        if standby is None or not standby.is_connected:
+            return False
 
+        self._session, self._standby = standby, None
+        standby.publish()
+        self.metrics.increment("standby_promotions")
+        _LOGGER.info("Standby link to %s took over", standby.address)
+        return True
+
+    def _record_usage(self) -> None:
+        """Count a user command in the hour of the day it came."""
+        now = dt_util.now()
+        today = now.date()
+        if self._usage_day != today:
+            if self._usage_day is not None:
+                decay = USAGE_DECAY ** (today - self._usage_day).days
+                self._usage = [count * decay for count in self._usage]
+            self._usage_day = today
+
+        self._usage[now.hour] += 1
+        self._last_command = time.monotonic()
+
+        if self._standby is None and self._standby_task is None and self.is_busy_hour():
+            self._standby_task = self.hass.async_create_background_task(
+                self._async_start_standby(), "awox standby"
+            )
 
+    def is_busy_hour(self) -> bool:
+        """Return True when the lights are usually used at this hour."""
+        count = self._usage[dt_util.now().hour]
+        return count >= max(BUSY_HOUR_MIN_COMMANDS, BUSY_HOUR_SHARE * max(self._usage))
+
+    def _wants_standby(self) -> bool:
+        return (
+            self._session.is_connected
+            and self._last_command is not None
+            and time.monotonic() - self._last_command < STANDBY_IDLE_TIMEOUT
+            and self.is_busy_hour()
+        )
+
+    async def _async_check_standby(self, now=None) -> None:
+        """Open or close the standby link as usage goes."""
+        if self._standby_task is not None:
+            return
+
+        if not self._wants_standby():
+            if self._standby is not None:
+                _LOGGER.info("Closing idle standby link to %s", self._standby.address)
+                await self._async_stop_standby()
+            return
+
+        if self._standby is None or not self._standby.is_connected:
+            self._standby_task = self.hass.async_create_background_task(
+                self._async_start_standby(), "awox standby"
+            )
 
-    @staticmethod
-    async def connect_to_device(ble_device, switch, awox_name, awox_pass):
+    async def _async_start_standby(self) -> None:
+        """Pair with the best other gateway, on a slot nobody else needs."""
+        try:
+            if not self._wants_standby():
+                return
+
+            budget = self.connection_budget
+            for ble_device in self.gateway_candidates(self._standby):
+                if budget is None or budget.has_free_slot(adapter_of(ble_device)):
+                    break
+            else:
+                return
+
+            standby = self._standby or AwoxMeshSession(self)
+            self._standby = standby
+            if await standby.async_connect_to(ble_device, PRIORITY_STANDBY):
+                self.metrics.increment("standby_connects")
+                _LOGGER.info("Standby link to %s ready", standby.address)
+            elif self._standby is standby:
+                self._standby = None
+        finally:
+            self._standby_task = None
 
-        _LOGGER.info("Device to connect :: %s", ble_device)
+    async def _async_stop_standby(self) -> None:
+        standby, self._standby = self._standby, None
+        if standby is not None:
+            await standby.async_close()
 
-        client = None
+    async def async_close_standby(self, standby: AwoxMeshSession) -> None:
+        """Close a standby link whose connection slot another connection wants.
 
-        try:
-            client = await establish_connection(
-                BleakClient,
-                ble_device,
-                ble_device.address,
-                disconnected_callback=None,
-                timeout=15,
-            )
+        It is opened again by the periodic check once a slot is free.
+        """
+        if self._standby is standby:
+            self._standby = None
+        if not self.is_primary(standby):
+            await standby.async_close()
 
-            _LOGGER.info("Connecting to %s...", ble_device)
+    def mesh_id_for_mac(self, mac: str) -> int | None:
+        """Return the mesh id of a configured device by MAC address."""
+        node = self._nodes_by_mac.get(mac.upper())
+        return node.mesh_id if node is not None else None
 
-            if client.is_connected:
-                _LOGGER.info("Connected to : %s", client.address)
+    def async_subscribe_status(self, mesh_id: int, listener) -> callable:
+        """Call listener with each status report of mesh_id.
 
-                pair_char = await client.read_gatt_char(PAIR_CHAR_UUID)
+        Returns a function that removes the listener.
+        """
+        listeners = self._status_listeners.setdefault(mesh_id, [])
+        listeners.append(listener)
 
-                name = awox_name.encode()
-                key = awox_pass.encode()
+        def unsubscribe() -> None:
+            listeners.remove(listener)
 
-                session_random = urandom(8)
+        return unsubscribe
 
-                packet = AwoxMeshLight.make_pair_packet(name, key, session_random)
+    def async_subscribe_remote(self, mesh_id: int, listener) -> callable:
+        """Call listener with each button press of the remote mesh_id.
 
-                await client.write_gatt_char(PAIR_CHAR_UUID, packet, response=True)
+        Returns a function that removes the listener.
+        """
+        listeners = self._remote_listeners.setdefault(mesh_id, [])
+        listeners.append(listener)
 
-                await client.read_gatt_char(STATUS_CHAR_UUID)
+        def unsubscribe() -> None:
+            listeners.remove(listener)
 
-                await client.write_gatt_char(STATUS_CHAR_UUID, b'\x01', response=True)
+        return unsubscribe
 
-                pair_char = await client.read_gatt_char(PAIR_CHAR_UUID)
+    def handle_notification(self, crypto, address, packet) -> bool:
+        """Decrypt and dispatch one notification from STATUS_CHAR_UUID.
 
-                if pair_char[0] == 0x0D:
-                    session_key = AwoxMeshLight.make_session_key(
-                        name, key, session_random, pair_char[1:9]
-                    )
+        Returns True when the packet came from the paired node, whether or
+        not it was a status report.
+        """
+        data = crypto.decrypt_packet(address, packet)
+        if data is None:
+            _LOGGER.debug("Dropped notification with bad checksum : %s", packet.hex())
+            return False
 
-                    _LOGGER.info("Paired.")
+        if self._remote_listeners:
+            event = parse_remote_packet(data)
+            if event is not None and self._remote_listeners.get(event['mesh_id']):
+                self._handle_remote_event(event)
+                return True
+
+        status = parse_status_packet(data)
+        if status is None:
+            _LOGGER.debug("Unhandled notification : %s", data.hex())
+            return True
+
+        self._handle_status(status)
+        return True
+
+    def _handle_remote_event(self, event: dict) -> None:
+        """Push a remote button press to its entities."""
+        mesh_id = event['mesh_id']
+
+        node = self._nodes_by_mesh_id.get(mesh_id)
+        if node is not None:
+            was_available = self.is_available(mesh_id)
+            node.last_status = time.monotonic()
+            if not was_available:
+                self._notify_presence(mesh_id)
+
+        for listener in list(self._remote_listeners[mesh_id]):
+            listener(event)
+
+    def _handle_status(self, status: dict) -> None:
+        """Store a node status and push it to its entities."""
+        mesh_id = status['mesh_id']
+        self.statuses[mesh_id] = status
+
+        if self._deliveries:
+            self._confirm_deliveries(status)
+
+        node = self._nodes_by_mesh_id.get(mesh_id)
+        if node is not None:
+            was_available = self.is_available(mesh_id)
+            node.last_status = time.monotonic()
+            if not was_available:
+                self._notify_presence(mesh_id)
+
+        # The hub level fields follow the gateway node
+        if mesh_id == self.mesh_id:
+            self.white_brightness = status['white_brightness']
+            self.white_temp = status['white_temp']
+            self.color_brightness = status['color_brightness']
+            self.red = status['red']
+            self.green = status['green']
+            self.blue = status['blue']
+            self.mode = status['mode']
+            self.status = status
+            self.is_on = status['state']
+
+        for listener in list(self._status_listeners.get(mesh_id, ())):
+            listener(status)
+
+    def light_mesh_ids(self) -> set[int]:
+        """Return the mesh ids of all configured lights."""
+        return {
+            device["mesh_id"]
+            for device in self._devices
+            if "light" in device.get("type", "")
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of commands waiting to be sent."""
+        return len(self._pending)
+
+    def diagnostics(self) -> dict:
+        """Return the state of the hub for the diagnostics download."""
+        now = time.monotonic()
+        return {
+            "connected": self._session.is_connected,
+            "gateway": self._session.address,
+            "standby": self._standby.address if self._standby is not None else None,
+            "busy_hour": self.is_busy_hour(),
+            "usage_per_hour": [round(count, 1) for count in self._usage],
+            "failovers": self.failovers,
+            "queue_depth": self.queue_depth,
+            "command_interval": self.command_interval,
+            "released": sorted(self._released),
+            "nodes": [
+                {
+                    "mac": node.mac,
+                    "mesh_id": node.mesh_id,
+                    "is_light": node.is_light,
+                    "rssi": node.rssi,
+                    "seconds_since_seen": (
+                        None if node.last_seen is None else round(now - node.last_seen, 1)
+                    ),
+                    "success_rate": node.success_rate,
+                    "connect_attempts": node.connect_attempts,
+                    "stale": node.stale,
+                    "ready_delay": node.ready_delay,
+                }
+                for node in self._nodes_by_mac.values()
+            ],
+            "metrics": self.metrics.as_dict(),
+        }
+
+    async def async_send_command(self, command, data, dest_id) -> bool:
+        """Queue one command to mesh node dest_id and wait until it is sent.
+
+        Writing without response, the wait lasts until the lights addressed
+        report their new status, the command is sent again to those that
+        stay silent.
+
+        A queued command for the same light and attribute is replaced, its
+        caller gets the result of the newer one. Identical commands queued
+        for several lights share one group or broadcast packet. A transition
+        or effect playing on the lights addressed stops first, also when it
+        plays on a room that holds one of them.
+        """
+        if self.effects is not None:
+            lights = self._destination_members(dest_id)
+            rooms = {address for address, members in self._groups.items() if members & lights}
+            self.effects.cancel(lights | rooms | {dest_id})
 
-                    await asyncio.sleep(2.0)
+        self._record_usage()
+        return await self.async_queue_command(command, data, dest_id)
 
-                    await AwoxMeshLight.writeCommand(C_POWER, switch, session_key, client)
+    async def async_queue_command(self, command, data, dest_id) -> bool:
+        """Same as async_send_command, but lets transitions and effects play.
 
-                    await client.disconnect()
-                    _LOGGER.info("Disconnected")
+        The effect engine sends its frames through here.
+        """
+        future = self.hass.loop.create_future()
+        key = (dest_id, command)
+
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            pending = _PendingCommand(dest_id, command, bytes(data))
+        else:
+            pending.data = bytes(data)
+        pending.futures.append(future)
+
+        # Re-inserting moves the key to the end, keeping send order fair
+        self._pending[key] = pending
+        self._pending_event.set()
+
+        self.metrics.increment("commands_queued")
+        if len(pending.futures) > 1:
+            self.metrics.increment("commands_coalesced")
+        self.metrics.maximum("queue_depth_max", len(self._pending))
+
+        if self._queue_task is None:
+            self._queue_task = self.hass.async_create_background_task(
+                self._async_process_queue(), "awox command queue"
+            )
+
+        return await future
 
-                    return True
+    async def async_queue_each(
+        self, commands: dict[int, list[tuple[int, bytes]]]
+    ) -> dict[int, list[bool]]:
+        """Queue a list of (command, data) per mesh id, return their results.
 
+        The queue keeps one pending command per light and command, so a
+        light's commands go one after the other, where a newer one would
+        replace the older. Those of different lights are queued together
+        and share packets when identical.
+        """
+        results: dict[int, list[bool]] = {mesh_id: [] for mesh_id in commands}
+
+        for index in range(max(map(len, commands.values()), default=0)):
+            batch = [
+                (mesh_id, node_commands[index])
+                for mesh_id, node_commands in commands.items()
+                if index < len(node_commands)
+            ]
+            sent = await asyncio.gather(
+                *(self.async_queue_command(command, data, mesh_id) for mesh_id, (command, data) in batch)
+            )
+            for (mesh_id, _), resp in zip(batch, sent):
+                results[mesh_id].append(resp)
+
+        return results
+
+    async def _async_process_queue(self) -> None:
+        """Send queued commands, one packet per command_interval."""
+        while True:
+            await self._pending_event.wait()
+            self._pending_event.clear()
+
+            # Let callers of the same loop iteration queue their commands
+            await asyncio.sleep(0)
+
+            while self._pending:
+                dest_id, command, data, covered = self._next_packet()
+
+                # Fast path: the write is not acknowledged, the status
+                # notifications of the lights are. Commands no status
+                # confirms are still written with response
+                delivery = None
+                response = not self.write_without_response or command not in ACKED_COMMANDS
+                if not response:
+                    delivery = self._track_delivery(covered)
+
+                self.metrics.increment("packets_sent")
+                try:
+                    resp = await self._session.async_send(command, data, dest_id, response)
+                except Exception as e:
+                    _LOGGER.info("Error sending command: %s", e)
+                    resp = False
+
+                if delivery is not None and resp:
+                    delivery.start(self.hass.loop, self._on_delivery_timeout)
                 else:
-                    if pair_char[0] == 0x0E:
-                        _LOGGER.info("Auth error : check name and password.")
-                    else:
-                        _LOGGER.info("Unexpected pair value : %s", repr(pair_char))
+                    if delivery is not None:
+                        self._deliveries.remove(delivery)
+                    for pending in covered:
+                        pending.resolve(resp)
+
+                await asyncio.sleep(self.command_interval)
+
+    def _destination_members(self, dest_id: int) -> set[int]:
+        """Return the mesh ids of the lights a packet to dest_id reaches."""
+        if dest_id == BROADCAST_MESH_ID:
+            return self.light_mesh_ids()
+        if dest_id & GROUP_ADDRESS_FLAG:
+            return self.group_members(dest_id)
+        return {dest_id}
+
+    def _track_delivery(self, covered: list[_PendingCommand]) -> _Delivery:
+        """Wait for the statuses confirming the commands of one packet.
+
+        Lights out of reach are not waited for when a group or broadcast
+        packet covers them. Earlier commands still waiting on the same
+        lights and attribute are superseded, their callers get the result
+        of the newer command.
+        """
+        waiting = {}
+        for pending in covered:
+            members = self._destination_members(pending.dest_id)
+            if pending.dest_id == BROADCAST_MESH_ID or pending.dest_id & GROUP_ADDRESS_FLAG:
+                members = {mesh_id for mesh_id in members if self.is_available(mesh_id)}
+            waiting[pending] = members
+
+            for delivery in list(self._deliveries):
+                if delivery.supersede(pending, members):
+                    delivery.cancel()
+                    self._deliveries.remove(delivery)
+
+        delivery = _Delivery(waiting)
+        self._deliveries.append(delivery)
+        return delivery
+
+    def _confirm_deliveries(self, status: dict) -> None:
+        """Count a status as the answer to the sent commands it reflects."""
+        for delivery in list(self._deliveries):
+            if delivery.confirm(status):
+                delivery.cancel()
+                self._deliveries.remove(delivery)
+
+    def _on_delivery_timeout(self, delivery: _Delivery) -> None:
+        """Queue again the commands some light did not confirm."""
+        if delivery not in self._deliveries:
+            return
+        self._deliveries.remove(delivery)
+
+        for pending, waiting in delivery.waiting.items():
+            key = (pending.dest_id, pending.command)
+            newer = self._pending.get(key)
+            if newer is not None:
+                # A newer value supersedes the unconfirmed one
+                newer.futures.extend(pending.futures)
+                continue
+
+            if pending.attempts >= ACK_RETRIES:
+                _LOGGER.info(
+                    "Command %#04x to %s not confirmed by %s",
+                    pending.command,
+                    pending.dest_id,
+                    sorted(waiting),
+                )
+                self.metrics.increment("commands_unconfirmed")
+                pending.resolve(False)
+                continue
+
+            pending.attempts += 1
+            self.metrics.increment("retries")
+            self._pending[key] = pending
+
+        if self._pending:
+            self._pending_event.set()
+
+    def _next_packet(self):
+        """Pop the queued commands that the next packet will carry.
+
+        The oldest command decides the command and data; every queued light
+        waiting for the same ones is a candidate for the same packet.
+        """
+        first = next(iter(self._pending.values()))
+        same = {
+            pending.dest_id: pending
+            for pending in self._pending.values()
+            if pending.command == first.command and pending.data == first.data
+        }
+
+        shared = first.command not in NODE_EDIT_COMMANDS
+        for dest_id, members in self.resolve_destinations(set(same), shared):
+            if first.dest_id in members:
+                break
+
+        covered = [same[member] for member in members]
+        for pending in covered:
+            del self._pending[(pending.dest_id, pending.command)]
+
+        return dest_id, first.command, first.data, covered
+
+    def resolve_destinations(
+        self, dest_ids: set[int], shared: bool = True
+    ) -> list[tuple[int, set[int]]]:
+        """Cover dest_ids with the fewest mesh addresses.
+
+        Returns (address, requested ids it covers) pairs. Broadcast is used
+        when every light is requested, groups when all their members are,
+        and single node addresses for the rest. Without shared, only node
+        addresses are used.
+        """
+        if not shared:
+            return [(dest_id, {dest_id}) for dest_id in sorted(dest_ids)]
 
-                    await client.disconnect()
-                    return False
+        lights = self.light_mesh_ids()
+        if len(dest_ids) > 1 and lights and dest_ids >= lights:
+            return [(BROADCAST_MESH_ID, dest_ids)]
 
-        except Exception as e:
-            _LOGGER.info("Error: %s", e)
-            return False
+        remaining = set(dest_ids)
+        destinations = []
 
-        finally:
-            if client and client.is_connected:
-                await client.disconnect()
-                
-                
-                
-    async def writeCommand (command, data,session_key,client ,dest = None):
+        for group_id, members in sorted(
+            self._groups.items(), key=lambda item: len(item[1]), reverse=True
+        ):
+            if len(members) > 1 and members <= remaining:
+                destinations.append((group_id, members & remaining))
+                remaining -= members
+
+        destinations.extend((dest_id, {dest_id}) for dest_id in sorted(remaining))
+        return destinations
+
+    @staticmethod
+    async def async_pair(client, awox_name, awox_pass, metrics = None):
+        """Run the pair handshake on a connected client.
+
+        Returns the session key, or None when the node refused the credentials.
+        """
+        await client.read_gatt_char(PAIR_CHAR_UUID)
+
+        name = awox_name.encode()
+        key = awox_pass.encode()
+
+        session_random = urandom(8)
+
+        packet = make_pair_packet(name, key, session_random)
+
+        await client.write_gatt_char(PAIR_CHAR_UUID, packet, response=True)
+
+        await client.read_gatt_char(STATUS_CHAR_UUID)
+
+        await client.write_gatt_char(STATUS_CHAR_UUID, b'\x01', response=True)
+
+        pair_char = await client.read_gatt_char(PAIR_CHAR_UUID)
+
+        if pair_char[0] == 0x0D:
+            _LOGGER.info("Paired.")
+            return make_session_key(
+                name, key, session_random, pair_char[1:9]
+            )
+
+        if pair_char[0] == 0x0E:
+            _LOGGER.info("Auth error : check name and password.")
+            if metrics is not None:
+                metrics.increment("auth_failures")
+        else:
+            _LOGGER.info("Unexpected pair value : %s", repr(pair_char))
+            if metrics is not None:
+                metrics.increment("unexpected_pair_values")
+
+        return None
+
+    @staticmethod
+    async def writeCommand (command, data,session_key,client ,dest = None, crypto = None, response = True):
         """
         Args:
             command: The command, as a number.
             data: The parameters for the command, as bytes.
             dest: The destination mesh id, as a number. If None, this lightbulb's
                 mesh id will be used.
+            crypto: The session's AwoxSessionCrypto, used instead of
+                session_key when given.
+            response: Write with response, False to write without.
         """
-        assert (session_key)
+        assert (session_key or crypto)
         
         #def make_command_packet (key, address, dest_id, command, data):
-        packet = AwoxMeshLight.make_command_packet (session_key, client.address, 0, command, data)
-        _LOGGER.info("packet send to : %s ",client.address)
+        if dest is None:
+            dest = 0
+
+        if crypto is not None:
+            packet = crypto.make_command_packet (client.address, dest, command, data)
+        else:
+            packet = make_command_packet (session_key, client.address, dest, command, data)
+        _LOGGER.info("packet send to : %s via %s",dest, client.address)
+
+        await client.write_gatt_char(COMMAND_CHAR_UUID, packet, response)
+
+        return len(packet)
+
+
+class AwoxMeshSession:
+    """Persistent, paired BLE link to one mesh node, owned by the hub.
+
+    The session connects and pairs once, then reuses the client and
+    session key for every command. Commands carry the destination mesh id,
+    so the connected node relays them to any light in the mesh. If the link
+    drops it reconnects in the background, and the next command waits for
+    it instead of running its own handshake.
+
+    A hub may hold a second, standby session: paired but silent, it only
+    becomes the hub's session when the first one drops.
+    """
+
+    RECONNECT_DELAYS = (0, 1, 2, 5, 10, 30)
+
+    def __init__(self, hub: AwoxMeshLight) -> None:
+        self._hub = hub
+        self._client: BleakClient | None = None
+        self._ble_device = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task: asyncio.Task | None = None
+        self._closing = False
+        # Connection slot held while the link is up
+        self._slot = None
+        self._last_prewarm = 0.0
+        self._last_write = 0.0
+
+        self.session_key = None
+        self.crypto: AwoxSessionCrypto | None = None
+
+    @property
+    def is_connected(self) -> bool:
+        """Return True when the link is up and paired."""
+        return (
+            self._client is not None
+            and self._client.is_connected
+            and self.session_key is not None
+        )
+
+    @property
+    def address(self) -> str | None:
+        """Return the address of the node the session is bound to."""
+        if self._client is None:
+            return None
+        return self._client.address
+
+    async def async_send(self, command, data, dest_id, response: bool = True) -> bool:
+        """Send a command, connecting or reconnecting first when needed.
+
+        Without response the write returns once the packet is handed to
+        the adapter, the node does not acknowledge it.
+        """
+        async with self._lock:
+            if not await self._async_ensure_connected():
+                return False
+
+            metrics = self._hub.metrics
+            try:
+                with metrics.timer("write"):
+                    written = await AwoxMeshLight.writeCommand(
+                        command, data, self.session_key, self._client, dest_id, self.crypto,
+                        response,
+                    )
+                metrics.increment("bytes_written", written)
+                self._last_write = time.monotonic()
+            except Exception as e:
+                metrics.increment("write_failures")
+                _LOGGER.info("Write failed on %s: %s", self.address, e)
+                await self._async_disconnect()
+                return False
+
+            return True
+
+    def async_prewarm(self) -> None:
+        """Reconnect in the background, so the next command finds the link up."""
+        if (
+            self._closing
+            or self.is_connected
+            or self._reconnect_task is not None
+            or self._lock.locked()
+            or not self._hub.is_primary(self)
+        ):
+            return
+
+        now = time.monotonic()
+        if now - self._last_prewarm < PREWARM_COOLDOWN:
+            return
+        self._last_prewarm = now
+
+        self._reconnect_task = self._hub.hass.async_create_background_task(
+            self._async_prewarm(), "awox prewarm"
+        )
+
+    async def _async_prewarm(self) -> None:
+        try:
+            async with self._lock:
+                if await self._async_ensure_connected(PRIORITY_BACKGROUND):
+                    _LOGGER.info("Session to %s prewarmed", self.address)
+                    self._hub.metrics.increment("prewarms")
+        finally:
+            self._reconnect_task = None
+
+    async def async_connect_to(self, ble_device, priority: int) -> bool:
+        """Connect to and pair with one given node."""
+        async with self._lock:
+            self._closing = False
+            self._ble_device = ble_device
+            connected = await self._async_connect(priority)
+            self._hub.record_connection(ble_device.address, connected)
+            return connected
+
+    async def async_disconnect(self) -> None:
+        """Drop the link, the next command connects to another gateway."""
+        async with self._lock:
+            await self._async_disconnect()
+
+    async def async_ensure_connected(self, priority: int = PRIORITY_USER) -> bool:
+        """Connect to a gateway now if the session is down."""
+        async with self._lock:
+            return await self._async_ensure_connected(priority)
+
+    async def async_close(self) -> None:
+        """Stop reconnecting and drop the link."""
+        self._closing = True
+
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        async with self._lock:
+            await self._async_disconnect()
+
+    async def _async_ensure_connected(self, priority: int = PRIORITY_USER) -> bool:
+        """Make sure the session is paired with a gateway. Caller holds the lock.
+
+        priority ranks the wait for a connection slot against the other
+        entries and firmware updates.
+        """
+        if self.is_connected:
+            return True
+
+        self._closing = False
+
+        previous = self._ble_device
+
+        try:
+            async with asyncio.timeout(FAILOVER_TIMEOUT):
+                for ble_device in self._hub.gateway_candidates(self):
+                    self._ble_device = ble_device
+                    connected = await self._async_connect(priority)
+                    self._hub.record_connection(ble_device.address, connected)
+                    if connected:
+                        break
+                else:
+                    _LOGGER.info("No mesh gateway reachable")
+                    return False
+        except TimeoutError:
+            _LOGGER.info("No mesh gateway reachable within %s s", FAILOVER_TIMEOUT)
+            return False
+
+        if previous is not None and previous.address.upper() != self._ble_device.address.upper():
+            self._hub.failovers += 1
+            self._hub.metrics.increment("failovers")
+            _LOGGER.info(
+                "Gateway failover %s -> %s (%d so far)",
+                previous.address,
+                self._ble_device.address,
+                self._hub.failovers,
+            )
+
+        return True
+
+    async def _async_connect(self, priority: int = PRIORITY_USER) -> bool:
+        """Connect to and pair with the current device. Caller holds the lock.
+
+        A slot of the shared connection budget is taken first and held
+        until the link goes down.
+        """
+        budget = self._hub.connection_budget
+        slot = None
+        if budget is not None:
+            slot = await budget.async_acquire(
+                adapter_of(self._ble_device), priority, self._yield_slot
+            )
+
+        connected = False
+        try:
+            async with asyncio.timeout(GATEWAY_CONNECT_TIMEOUT):
+                connected = await self._async_open()
+        except TimeoutError:
+            _LOGGER.info("No answer from %s within %s s", self._ble_device.address, GATEWAY_CONNECT_TIMEOUT)
+            self._hub.metrics.increment("connect_failures")
+        finally:
+            if slot is not None:
+                if connected:
+                    self._slot = slot
+                else:
+                    slot.release()
 
-        await client.read_gatt_char(COMMAND_CHAR_UUID)
-        await client.write_gatt_char(COMMAND_CHAR_UUID, packet, True)
-        await client.read_gatt_char(COMMAND_CHAR_UUID)
+        if connected:
+            self._last_write = time.monotonic()
+        return connected
 
+    def _yield_slot(self, priority: int) -> bool:
+        """Drop the link for a slot waiter of higher priority, see AwoxConnectionBudget.
+
+        The session counts as a user connection while commands flow, as a
+        background one once idle. A standby link only stays on a slot nobody
+        else wants, any waiter closes it.
+        """
+        if not self._hub.is_primary(self):
+            _LOGGER.info("Closing standby link to %s, its connection slot is wanted", self.address)
+            self._hub.metrics.increment("slot_yields")
+            self._hub.hass.async_create_background_task(
+                self._hub.async_close_standby(self), "awox standby close"
+            )
+            return True
+
+        if self._lock.locked() or time.monotonic() - self._last_write < SESSION_BUSY_TIME:
+            held = PRIORITY_USER
+        else:
+            held = PRIORITY_BACKGROUND
+
+        if priority >= held:
+            return False
+
+        _LOGGER.info("Giving the link to %s up for another connection", self.address)
+        self._hub.metrics.increment("slot_yields")
+        self._hub.hass.async_create_background_task(self.async_disconnect(), "awox slot yield")
+        return True
+
+    async def _async_open(self) -> bool:
+        """Open the link to the current device and pair with it."""
+        ble_device = self._ble_device
+
+        _LOGGER.info("Device to connect :: %s", ble_device)
+
+        client = None
+        metrics = self._hub.metrics
+        metrics.increment("connects")
+
+        try:
+            with metrics.timer("connect"):
+                client = await self._hub.connector(ble_device, self._on_disconnect)
+
+            if not client.is_connected:
+                metrics.increment("connect_failures")
+                return False
+
+            _LOGGER.info("Connected to : %s", client.address)
+
+            with metrics.timer("pair"):
+                session_key = await AwoxMeshLight.async_pair(
+                    client, self._hub._mesh_name, self._hub.mesh_password, metrics
+                )
+
+            if session_key is None:
+                await client.disconnect()
+                return False
+
+            crypto = AwoxSessionCrypto(session_key)
+            address = client.address
+            answered = asyncio.Event()
+
+            def on_notification(_: BleakGATTCharacteristic, data: bytearray) -> None:
+                if answered.is_set() and not self._hub.is_primary(self):
+                    # The session reports the mesh, a standby only listens once
+                    return
+                if self._hub.handle_notification(crypto, address, data):
+                    answered.set()
+
+            await client.start_notify(STATUS_CHAR_UUID, on_notification)
+
+            with metrics.timer("ready"):
+                await self._async_wait_ready(client, crypto, answered)
+
+        except asyncio.CancelledError:
+            if client and client.is_connected:
+                await client.disconnect()
+            raise
+
+        except Exception as e:
+            _LOGGER.info("Error: %s", e)
+            metrics.increment("connect_failures")
+            if client and client.is_connected:
+                await client.disconnect()
+            return False
+
+        self._client = client
+        self.session_key = session_key
+        self.crypto = crypto
+        if self._hub.is_primary(self):
+            self.publish()
+
+        return True
+
+    def publish(self) -> None:
+        """Show the link as the hub's gateway."""
+        self._hub.session_key = self.session_key
+        self._hub.mac = self._client.address
+        self._hub.mesh_id = self._hub.mesh_id_for_mac(self._client.address) or 0
+        self._hub.notify_gateway_changed()
+        self._hub.connected = True
+
+    def _unpublish(self) -> None:
+        if self._hub.is_primary(self):
+            self._hub.session_key = None
+            self._hub.connected = False
+            self._hub.notify_gateway_changed()
+
+    async def _async_wait_ready(self, client, crypto, answered: asyncio.Event) -> None:
+        """Wait until a freshly paired node takes commands.
+
+        The node is asked for the status of the whole mesh, again every
+        READY_TIMEOUT_MIN, and its first answer proves it takes our
+        packets. Nodes that stay silent get a command characteristic
+        readback once their adaptive timeout runs out, and are used anyway,
+        as they were after the fixed sleep this wait replaces.
+        """
+        start = time.monotonic()
+        timeout = self._hub.ready_timeout(client.address)
+
+        try:
+            async with asyncio.timeout(timeout):
+                # A node still settling drops the request, so ask again
+                while True:
+                    await AwoxMeshLight.writeCommand(
+                        C_GET_STATUS_SENT, b'\x10', None, client, BROADCAST_MESH_ID, crypto
+                    )
+                    try:
+                        async with asyncio.timeout(READY_TIMEOUT_MIN):
+                            await answered.wait()
+                        break
+                    except TimeoutError:
+                        continue
+        except TimeoutError:
+            _LOGGER.info(
+                "No status from %s within %.2f s, checking with a readback",
+                client.address,
+                timeout,
+            )
+            self._hub.metrics.increment("ready_timeouts")
+            await client.read_gatt_char(COMMAND_CHAR_UUID)
+
+        self._hub.record_ready_delay(client.address, time.monotonic() - start)
+
+    async def _async_disconnect(self) -> None:
+        """Drop the link without scheduling a reconnect. Caller holds the lock."""
+        client = self._client
+
+        self._client = None
+        self.session_key = None
+        self.crypto = None
+        self._unpublish()
+
+        if client is not None and client.is_connected:
+            try:
+                with self._hub.metrics.timer("disconnect"):
+                    await client.disconnect()
+            except Exception as e:
+                _LOGGER.info("Error while disconnecting: %s", e)
+            _LOGGER.info("Disconnected")
+
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        if self._slot is not None:
+            self._slot.release()
+            self._slot = None
+
+    def _on_disconnect(self, client: BleakClient) -> None:
+        """Handle an unexpected drop by reconnecting in the background."""
+        if client is not self._client:
+            return
+
+        _LOGGER.info("Session to %s dropped", client.address)
+
+        # A drop weighs on the node like a failed connection
+        self._hub.record_connection(client.address, False)
+        self._hub.metrics.increment("drops")
+        self._release_slot()
+
+        self._client = None
+        self.session_key = None
+        self.crypto = None
+        self._unpublish()
+
+        if self._closing or self._reconnect_task is not None:
+            return
+
+        # A dropped standby is opened again by the hub when still wanted
+        if not self._hub.is_primary(self) or self._hub.promote_standby():
+            return
+
+        self._reconnect_task = self._hub.hass.async_create_task(
+            self._async_reconnect()
+        )
+
+    async def _async_reconnect(self) -> None:
+        """Retry the connection with a growing delay until it comes back."""
+        try:
+            for delay in self.RECONNECT_DELAYS:
+                await asyncio.sleep(delay)
+                if self._closing:
+                    return
+                async with self._lock:
+                    if await self._async_ensure_connected(PRIORITY_BACKGROUND):
+                        _LOGGER.info("Session to %s restored", self.address)
+                        self._hub.metrics.increment("reconnects")
+                        return
+            _LOGGER.info("Giving up reconnecting, next command will retry")
+        finally:
+            self._reconnect_task = None
+
+
+class MeshNode:
+    """Presence index entry of one configured mesh node."""
+
+    __slots__ = (
+        "mac",
+        "mesh_id",
+        "is_light",
+        "ble_device",
+        "rssi",
+        "last_advertisement",
+        "last_status",
+        "connect_attempts",
+        "connect_successes",
+        "ready_delay",
+        "stale",
+    )
+
+    def __init__(self, mac: str, mesh_id: int, is_light: bool) -> None:
+        self.mac = mac
+        self.mesh_id = mesh_id
+        self.is_light = is_light
+        self.ble_device = None
+        self.rssi: int | None = None
+        self.last_advertisement: float | None = None
+        self.last_status: float | None = None
+        self.connect_attempts = 0
+        self.connect_successes = 0
+        self.ready_delay: float | None = None
+        # Failed or dropped since its last advertisement
+        self.stale = False
+
+    @property
+    def success_rate(self) -> float:
+        """Return the connection success rate, 0.5 for an unknown node."""
+        return (self.connect_successes + 1) / (self.connect_attempts + 2)
+
+    @property
+    def gateway_score(self) -> float:
+        """Return how good a gateway the node is, higher is better."""
+        rssi = self.rssi if self.rssi is not None else -100
+        return rssi + SUCCESS_RATE_WEIGHT * self.success_rate
+
+    @property
+    def last_seen(self) -> float | None:
+        """Return the monotonic time the node was last heard of, either way."""
+        if self.last_advertisement is None:
+            return self.last_status
+        if self.last_status is None:
+            return self.last_advertisement
+        return max(self.last_advertisement, self.last_status)
+
+    def update_from_advertisement(self, service_info: BluetoothServiceInfoBleak) -> None:
+        """Record the device, RSSI and time of an advertisement."""
+        self.ble_device = service_info.device
+        self.rssi = service_info.rssi
+        self.last_advertisement = service_info.time
+        self.stale = False
+
+
+class _PendingCommand:
+    """A queued command and the callers waiting for it."""
+
+    __slots__ = ("dest_id", "command", "data", "futures", "attempts")
+
+    def __init__(self, dest_id: int, command: int, data: bytes) -> None:
+        self.dest_id = dest_id
+        self.command = command
+        self.data = data
+        self.futures: list[asyncio.Future] = []
+        # Times it was sent again for lack of a confirming status
+        self.attempts = 0
+
+    def resolve(self, result: bool) -> None:
+        """Wake up every caller with the send result."""
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+
+class _Delivery:
+    """Commands written without response, waiting for confirming statuses."""
+
+    __slots__ = ("waiting", "_timer")
+
+    def __init__(self, waiting: dict[_PendingCommand, set[int]]) -> None:
+        # Command -> mesh ids that did not report since it was sent
+        self.waiting = waiting
+        self._timer: asyncio.TimerHandle | None = None
+
+    def start(self, loop: asyncio.AbstractEventLoop, on_timeout) -> None:
+        """Resolve what is already confirmed and arm the retry timer."""
+        for pending in [pending for pending, waiting in self.waiting.items() if not waiting]:
+            del self.waiting[pending]
+            pending.resolve(True)
+
+        self._timer = loop.call_later(ACK_TIMEOUT, on_timeout, self)
+
+    def confirm(self, status: dict) -> bool:
+        """Count a status, return True once all commands are confirmed.
+
+        The status only confirms the commands whose effect it shows.
+        """
+        mesh_id = status['mesh_id']
+        for pending, waiting in list(self.waiting.items()):
+            if mesh_id not in waiting or not status_confirms(status, pending.command, pending.data):
+                continue
+            waiting.discard(mesh_id)
+            if not waiting and self._timer is not None:
+                del self.waiting[pending]
+                pending.resolve(True)
+
+        return self._timer is not None and not self.waiting
+
+    def supersede(self, newer: _PendingCommand, members: set[int]) -> bool:
+        """Stop waiting on members for commands newer overwrites.
+
+        A command left without lights to wait on hands its callers to
+        newer. Returns True once nothing is left to confirm.
+        """
+        for pending, waiting in list(self.waiting.items()):
+            if pending.command != newer.command or not waiting & members:
+                continue
+            waiting -= members
+            if not waiting:
+                del self.waiting[pending]
+                newer.futures.extend(pending.futures)
+
+        return self._timer is not None and not self.waiting
+
+    def cancel(self) -> None:
+        """Stop the retry timer and fail the commands still unconfirmed."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for pending in self.waiting:
+            pending.resolve(False)
+        self.waiting.clear()
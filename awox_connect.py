@@ -5,18 +5,36 @@
 
 
 """Awox connect API"""
-import requests
+import asyncio
 import json
+import logging
 import uuid
 
+import aiohttp
+
 AWOX_CONNECT_URL = 'https://l4hparse-prod.awox.cloud/parse/'
 AWOX_CONNECT_APPLICATION_ID = '55O69FLtoxPt67LLwaHGpHmVWndhZGn9Wty8PLrJ'
 AWOX_CONNECT_CLIENT_KEY = 'PyR3yV65rytEicteNlQHSVNpAGvCByOrsLiEqJtI'
 
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=15)
+RETRY_DELAYS = (1, 2, 4)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AwoxConnectError(Exception):
+    """Raised when the AwoX cloud refuses a request or stays unreachable."""
+
 
 class AwoxConnect:
+    """Asyncio client of the AwoX Smart Connect (Parse) cloud.
 
-    def __init__(self, username: str, password: str, installation_id: str = None):
+    Requests go through the given aiohttp session, so connections are
+    kept alive and shared with the rest of Home Assistant.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, username: str, password: str, installation_id: str = None):
+        self._session = session
         self._username = username.lower() #Awox Connect API requires lowercase username
         self._password = password
 
@@ -27,49 +45,82 @@ class AwoxConnect:
         if not self._installation_id:
             self._installation_id = str(uuid.uuid4())
 
-        self.login()
-
-    def login(self):
-        payload = json.dumps({"username": self._username, "password": self._password, "_method": "GET"})
-
+    def _headers(self) -> dict:
         headers = {
             'x-parse-application-id': AWOX_CONNECT_APPLICATION_ID,
             'x-parse-installation-id': self._installation_id,
             'x-parse-client-key': AWOX_CONNECT_CLIENT_KEY,
             'content-type': 'application/json'
         }
-
-        response = requests.request("POST", AWOX_CONNECT_URL + 'login', headers=headers, data=payload)
-
-        if response.status_code != 200:
-            raise Exception('Login failed - %s' % response.json()['error'])
-
-        self._object_id = response.json()['objectId']
-        self._session_token = response.json()['sessionToken']
-
-    def _fetch_class(self, class_name: str):
-        payload = json.dumps({
-            "where":
-                {"owner": {"__type": "Pointer", "className": "_User", "objectId": self._object_id}},
+        if self._session_token:
+            headers['x-parse-session-token'] = self._session_token
+        return headers
+
+    async def _async_request(self, path: str, payload: dict) -> tuple[int, dict]:
+        """POST to the Parse API, retrying with backoff on network, server and decode errors."""
+        data = json.dumps(payload)
+
+        for attempt, delay in enumerate((0,) + RETRY_DELAYS):
+            if delay:
+                await asyncio.sleep(delay)
+
+            try:
+                async with self._session.post(
+                    AWOX_CONNECT_URL + path,
+                    headers=self._headers(),
+                    data=data,
+                    timeout=REQUEST_TIMEOUT,
+                ) as response:
+                    if response.status < 500:
+                        return response.status, await response.json(content_type=None)
+                    error = 'HTTP %s' % response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                # A proxy or error page instead of the API's JSON counts as unreachable
+                error = repr(e)
+
+            _LOGGER.info('AwoX cloud request %s failed (attempt %d): %s', path, attempt + 1, error)
+
+        raise AwoxConnectError('AwoX cloud unreachable - %s' % error)
+
+    async def async_login(self):
+        status, result = await self._async_request(
+            'login', {"username": self._username, "password": self._password, "_method": "GET"}
+        )
+
+        if status != 200:
+            raise AwoxConnectError('Login failed - %s' % result.get('error'))
+
+        self._object_id = result['objectId']
+        self._session_token = result['sessionToken']
+
+    async def _async_fetch_class(self, class_name: str, updated_since: str = None):
+        """Return the user's objects of a class, only those changed after updated_since when given."""
+        if self._session_token is None:
+            await self.async_login()
+
+        where = {"owner": {"__type": "Pointer", "className": "_User", "objectId": self._object_id}}
+        if updated_since:
+            where["updatedAt"] = {"$gt": {"__type": "Date", "iso": updated_since}}
+
+        status, result = await self._async_request('classes/' + class_name, {
+            "where": where,
             "_method": "GET"
         })
-        headers = {
-            'x-parse-application-id': AWOX_CONNECT_APPLICATION_ID,
-            'x-parse-installation-id': self._installation_id,
-            'x-parse-client-key': AWOX_CONNECT_CLIENT_KEY,
-            'content-type': 'application/json',
-            'x-parse-session-token': self._session_token
-        }
 
-        response = requests.request("POST", AWOX_CONNECT_URL + 'classes/' + class_name, headers=headers, data=payload)
+        if status != 200:
+            raise AwoxConnectError('Loading data failed - %s' % result.get('error'))
 
-        if response.status_code != 200:
-            raise Exception('Loading data failed - %s' % response.json()['error'])
+        return result['results']
 
-        return response.json()['results']
+    async def async_fetch_inventory(self, updated_since: str = None):
+        """Return the (devices, credentials) lists, fetched concurrently.
 
-    def credentials(self):
-        return self._fetch_class('Credential')[0]
+        With updated_since, an ISO date, only objects changed after it are returned.
+        """
+        if self._session_token is None:
+            await self.async_login()
 
-    def devices(self):
-        return self._fetch_class('Device')
\ No newline at end of file
+        return await asyncio.gather(
+            self._async_fetch_class('Device', updated_since),
+            self._async_fetch_class('Credential', updated_since),
+        )
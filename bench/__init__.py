@@ -0,0 +1,11 @@
+"""Simulated AwoX mesh and benchmarks of the hub code paths.
+
+Run from the directory that holds the integration, e.g. custom_components:
+
+    python -m awox.bench --lights 10 --latency 0.02 --drop-rate 0.01
+
+The protocol benches alone run without Home Assistant, from inside the
+integration directory:
+
+    python -m bench --core
+"""
@@ -0,0 +1,288 @@
+"""Benchmark the hub code paths against a simulated mesh."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import struct
+import time
+import tracemalloc
+from os import urandom
+from types import SimpleNamespace
+
+from .core import (
+    C_COLOR_BRIGHTNESS,
+    C_POWER,
+    AwoxSessionCrypto,
+    encode_color,
+    encode_color_brightness,
+    encode_power,
+    encrypt,
+    make_command_packet,
+    parse_status_packet,
+)
+from .fake_mesh import FakeLight, FakeMeshNode, fake_connector
+
+MESH_NAME = "bench"
+MESH_PASSWORD = "1234"
+GATEWAY_MAC = "A4:C1:38:00:00:01"
+
+
+class BenchHass:
+    """The few HomeAssistant members the hub uses outside of async_start."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+
+    def async_create_task(self, coro):
+        return self.loop.create_task(coro)
+
+    def async_create_background_task(self, coro, name):
+        return self.loop.create_task(coro, name=name)
+
+
+def _percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _allocations(build, count: int) -> tuple[int, float]:
+    """Return the peak bytes of one packet build and the blocks allocated per packet.
+
+    Blocks are counted in tracemalloc snapshots around count builds whose
+    packets are all kept, so each packet's own blocks are counted; a buffer
+    reused from build to build counts once.
+    """
+    build()
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+
+    packets = [None] * count
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        packets[i] = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return peak, blocks / count
+
+
+def list_comprehension_packet(key, address, dest_id, command, data):
+    """make_command_packet as it was before xor_bytes, the before case of the bench."""
+    s = urandom(3)
+    a = bytearray.fromhex(address.replace(":", ""))
+    a.reverse()
+    nonce = bytes(a[0:4] + b'\x01' + s)
+    payload = (struct.pack("<H", dest_id) + struct.pack('B', command) + b'\x60\x01' + data).ljust(15, b'\x00')
+
+    check = encrypt(key, (nonce + bytearray([len(payload)])).ljust(16, b'\x00'))
+    for i in range(0, len(payload), 16):
+        check_payload = bytearray(payload[i:i + 16].ljust(16, b'\x00'))
+        check = encrypt(key, bytearray([a ^ b for (a, b) in zip(check, check_payload)]))
+
+    base = bytearray(b'\x00' + nonce).ljust(16, b'\x00')
+    result = bytearray()
+    for i in range(0, len(payload), 16):
+        enc_base = encrypt(key, base)
+        result += bytearray([a ^ b for (a, b) in zip(enc_base, bytearray(payload[i:i + 16]))])
+        base[0] += 1
+
+    return s + check[0:2] + result
+
+
+def bench_packet_encoding(count: int) -> None:
+    key = urandom(16)
+    crypto = AwoxSessionCrypto(key)
+    builders = {
+        "before": lambda: list_comprehension_packet(key, GATEWAY_MAC, 1, C_POWER, b"\x01"),
+        "static": lambda: make_command_packet(key, GATEWAY_MAC, 1, C_POWER, b"\x01"),
+        "session": lambda: crypto.make_command_packet(GATEWAY_MAC, 1, C_POWER, b"\x01"),
+    }
+
+    rates = []
+    for label, build in builders.items():
+        start = time.perf_counter()
+        for _ in range(count):
+            build()
+        rates.append(f"{label} {count / (time.perf_counter() - start):8.0f} pkt/s")
+    print("packet encoding      " + "   ".join(rates))
+
+    allocations = []
+    for label, build in builders.items():
+        peak, blocks = _allocations(build, count)
+        allocations.append(f"{label} {peak:5d} B peak, {blocks:.2f} blocks")
+    print("packet allocations   " + "   ".join(allocations) + "  per packet")
+
+
+def bench_status_decoding(count: int) -> None:
+    node = FakeMeshNode(GATEWAY_MAC, MESH_NAME, MESH_PASSWORD, [1])
+    node._crypto = crypto = AwoxSessionCrypto(urandom(16))
+    packets = []
+    node._notify = lambda _, packet: packets.append(packet)
+    node._send_status(FakeLight(1))
+    packet = packets[0]
+
+    start = time.perf_counter()
+    for _ in range(count):
+        parse_status_packet(crypto.decrypt_packet(GATEWAY_MAC, packet))
+    elapsed = time.perf_counter() - start
+
+    print(f"status decoding      {count / elapsed:10.0f} pkt/s")
+
+
+async def _async_make_hub(args):
+    # The hub side needs Home Assistant, the protocol benches above do not
+    from ..awox import AwoxMeshLight
+    from ..connection_budget import AwoxConnectionBudget
+    from ..effects import AwoxEffectEngine
+
+    mesh_ids = list(range(1, args.lights + 1))
+    node = FakeMeshNode(
+        GATEWAY_MAC, MESH_NAME, MESH_PASSWORD, mesh_ids, args.latency, args.drop_rate,
+        args.ready_delay,
+    )
+    devices = [
+        {
+            "mesh_id": mesh_id,
+            "mac": GATEWAY_MAC if mesh_id == 1 else f"A4:C1:38:00:{mesh_id >> 8:02X}:{mesh_id & 0xFF:02X}",
+            "name": f"light {mesh_id}",
+            "type": ".ble.tlmesh.light.switch.color.white.dimming.temperature.",
+        }
+        for mesh_id in mesh_ids
+    ]
+
+    hub = AwoxMeshLight(
+        BenchHass(asyncio.get_running_loop()),
+        MESH_NAME,
+        MESH_PASSWORD,
+        "",
+        devices,
+        args.interval,
+        fake_connector({GATEWAY_MAC: node}),
+    )
+    hub.effects = AwoxEffectEngine(hub.hass, hub)
+    hub.connection_budget = AwoxConnectionBudget()
+    hub.metrics.enabled = args.metrics
+    hub.write_without_response = args.no_response
+    hub.node(1).update_from_advertisement(
+        SimpleNamespace(device=SimpleNamespace(address=GATEWAY_MAC), rssi=-60, time=time.monotonic())
+    )
+    return hub, node
+
+
+async def async_bench_hub(args) -> None:
+    hub, node = await _async_make_hub(args)
+
+    start = time.perf_counter()
+    await hub._session.async_ensure_connected()
+    print(f"connect + pair       {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+    # Single command latency on the open session
+    latencies = []
+    for i in range(args.iterations):
+        start = time.perf_counter()
+        await hub.async_send_command(*encode_power(i % 2 == 0), 1)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(args.interval)
+    print(
+        f"command latency      p50 {_percentile(latencies, 50) * 1000:8.2f} ms"
+        f"   p99 {_percentile(latencies, 99) * 1000:8.2f} ms"
+    )
+
+    # Scene fan-out, same command to every light and one per light
+    mesh_ids = list(range(1, args.lights + 1))
+    for label, commands in (
+        ("scene, same command", [encode_power(True)] * len(mesh_ids)),
+        ("scene, per light", [encode_color(i * 20 % 256, 0, 0) for i in mesh_ids]),
+    ):
+        received = node.packets_received
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(hub.async_send_command(command, data, mesh_id)
+              for (command, data), mesh_id in zip(commands, mesh_ids))
+        )
+        print(
+            f"{label:20} {(time.perf_counter() - start) * 1000:10.1f} ms"
+            f"   {node.packets_received - received} packets for {len(mesh_ids)} lights"
+        )
+
+    # Throughput of a slider drag on every light, one step per loop iteration
+    received = node.packets_received
+    start = time.perf_counter()
+    pending = []
+    for step in range(args.iterations):
+        pending.extend(
+            asyncio.ensure_future(
+                hub.async_send_command(*encode_color_brightness(0x0A + (step + mesh_id) % 90), mesh_id)
+            )
+            for mesh_id in mesh_ids
+        )
+        await asyncio.sleep(0)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - start
+    sent = node.packets_received - received
+    print(
+        f"slider burst         {args.iterations * len(mesh_ids):6d} requests -> {sent} packets"
+        f"   {sent / elapsed:8.0f} pkt/s"
+    )
+
+    # Fades on every light, together then each its own way
+    for label, spread in (("fade, together", 0), ("fade, staggered", 7)):
+        received = node.packets_received
+        sent, dropped = hub.effects.frames_sent, hub.effects.frames_dropped
+        start = time.perf_counter()
+        for mesh_id in mesh_ids:
+            hub.effects.start_transition(
+                mesh_id, {C_COLOR_BRIGHTNESS: ((0x0A,), (0x64 - spread * mesh_id % 40,))}, 1.0
+            )
+        while any(hub.effects.is_playing(mesh_id) for mesh_id in mesh_ids):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(args.latency * 2 + args.interval)
+        print(
+            f"{label:20} {(time.perf_counter() - start) * 1000:10.1f} ms"
+            f"   {hub.effects.frames_sent - sent} frames, {hub.effects.frames_dropped - dropped} dropped,"
+            f" {node.packets_received - received} packets"
+        )
+
+    print(
+        f"mesh                 {node.packets_received} packets, {node.packets_dropped} dropped,"
+        f" {node.bad_packets} bad, {len(hub.statuses)} lights reported status"
+    )
+
+    if args.metrics:
+        for name, histogram in hub.metrics.histograms.items():
+            print(
+                f"phase {name:14} {histogram.count:6d} x   mean {histogram.mean:8.2f} ms"
+                f"   max {histogram.maximum:8.2f} ms"
+            )
+        for name, value in sorted(hub.metrics.counters.items()):
+            print(f"counter {name:20} {value}")
+
+    await hub.async_shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lights", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="one-way radio latency, seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance a command is lost")
+    parser.add_argument("--ready-delay", type=float, default=0.0, help="node deaf time after pairing, seconds")
+    parser.add_argument("--interval", type=float, default=0.0, help="hub command interval, seconds")
+    parser.add_argument("--no-response", action="store_true", help="write without response")
+    parser.add_argument("--core", action="store_true", help="only bench the protocol core")
+    parser.add_argument("--metrics", action="store_true", help="collect and print hub metrics")
+    args = parser.parse_args()
+
+    if not args.core and "." not in __package__:
+        parser.error("the hub bench needs Home Assistant, run python -m awox.bench or add --core")
+
+    bench_packet_encoding(args.iterations * 100)
+    bench_status_decoding(args.iterations * 100)
+    if not args.core:
+        asyncio.run(async_bench_hub(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""The protocol core the benches run on.
+
+It comes from the integration, or from protocol.py alone when the bench
+runs as its own package from inside the integration directory, which
+needs no Home Assistant:
+
+    python -m bench --core
+"""
+try:
+    from ..protocol import *  # noqa: F401,F403
+except ImportError:
+    from protocol import *  # noqa: F401,F403
@@ -0,0 +1,274 @@
+"""Simulated Telink mesh node, seen through a BleakClient look-alike."""
+from __future__ import annotations
+
+import asyncio
+import random
+import struct
+from os import urandom
+
+from .core import (
+    BROADCAST_MESH_ID,
+    C_COLOR,
+    C_COLOR_BRIGHTNESS,
+    C_GET_STATUS_RECEIVED,
+    C_GET_STATUS_SENT,
+    C_GROUP_EDIT,
+    C_NOTIFICATION_RECEIVED,
+    C_POWER,
+    C_PRESET,
+    C_SCENE_EDIT,
+    C_SCENE_LOAD,
+    C_WHITE_BRIGHTNESS,
+    C_WHITE_TEMPERATURE,
+    COMMAND_CHAR_UUID,
+    GROUP_ADDRESS_FLAG,
+    PAIR_CHAR_UUID,
+    STATUS_CHAR_UUID,
+    AwoxSessionCrypto,
+    make_pair_packet,
+    make_session_key,
+)
+
+
+class FakeLight:
+    """State of one simulated mesh light."""
+
+    def __init__(self, mesh_id: int) -> None:
+        self.mesh_id = mesh_id
+        self.groups: set[int] = set()
+        # Scene slot -> (mode, white brightness, white temp, color brightness, r, g, b)
+        self.scenes: dict[int, tuple[int, ...]] = {}
+        self.on = False
+        self.color_mode = False
+        self.white_brightness = 0x7F
+        self.white_temp = 0x40
+        self.color_brightness = 0x64
+        self.rgb = (255, 255, 255)
+        self.preset: int | None = None
+
+    def apply(self, command: int, params: bytes) -> bool:
+        """Apply a command, return True when it changed something visible."""
+        if command == C_POWER:
+            self.on = params[0] == 1
+        elif command == C_WHITE_BRIGHTNESS:
+            self.white_brightness, self.color_mode = params[0], False
+        elif command == C_WHITE_TEMPERATURE:
+            self.white_temp, self.color_mode = params[0], False
+        elif command == C_COLOR_BRIGHTNESS:
+            self.color_brightness, self.color_mode = params[0], True
+        elif command == C_COLOR:
+            self.rgb, self.color_mode = tuple(params[1:4]), True
+        elif command == C_PRESET:
+            self.preset, self.color_mode = params[0], True
+        elif command == C_SCENE_EDIT:
+            if params[0]:
+                self.scenes[params[1]] = tuple(params[2:9])
+            else:
+                self.scenes.pop(params[1], None)
+            return False
+        elif command == C_SCENE_LOAD:
+            if params[0] not in self.scenes:
+                return False
+            mode, self.white_brightness, self.white_temp, self.color_brightness, *rgb = self.scenes[params[0]]
+            self.on, self.color_mode, self.rgb = bool(mode & 1), bool(mode & 2), tuple(rgb)
+        else:
+            return False
+        return True
+
+    @property
+    def mode(self) -> int:
+        return (1 if self.on else 0) | (2 if self.color_mode else 0)
+
+    def status_payload(self) -> bytes:
+        """Return bytes 7-19 of a 0xdc status report for this light."""
+        return bytes(
+            [C_NOTIFICATION_RECEIVED, 0x60, 0x01, self.mesh_id & 0xFF, 0x64, self.mode,
+             self.white_brightness, self.white_temp, self.color_brightness, *self.rgb,
+             self.mesh_id >> 8]
+        )
+
+    def status_reply_payload(self) -> bytes:
+        """Return bytes 7-19 of a 0xdb answer to a status request."""
+        return bytes(
+            [C_GET_STATUS_RECEIVED, 0x60, 0x01, self.mode, self.white_brightness,
+             self.white_temp, self.color_brightness, *self.rgb, 0, 0, 0]
+        )
+
+
+class FakeMeshNode:
+    """A gateway node and the lights it relays to.
+
+    It runs the pair handshake, decrypts command packets with the session
+    key, applies them to the lights and answers with encrypted status
+    notifications, after the configured latency. drop_rate is the chance
+    that a command packet is lost in the mesh, ready_delay how long after
+    pairing the node ignores commands.
+    """
+
+    def __init__(
+        self,
+        mac: str,
+        mesh_name: str,
+        mesh_password: str,
+        mesh_ids: list[int],
+        latency: float = 0.0,
+        drop_rate: float = 0.0,
+        ready_delay: float = 0.0,
+    ) -> None:
+        self.mac = mac
+        self._name = mesh_name.encode()
+        self._password = mesh_password.encode()
+        self.lights = {mesh_id: FakeLight(mesh_id) for mesh_id in mesh_ids}
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.ready_delay = ready_delay
+
+        self.packets_received = 0
+        self.packets_dropped = 0
+        self.bad_packets = 0
+
+        self._pair_response = b'\x00'
+        self._crypto: AwoxSessionCrypto | None = None
+        self._paired_at = 0.0
+        self._notify = None
+
+    def _targets(self, dest_id: int) -> list[FakeLight]:
+        if dest_id == BROADCAST_MESH_ID:
+            return list(self.lights.values())
+        if dest_id & GROUP_ADDRESS_FLAG:
+            return [light for light in self.lights.values() if dest_id in light.groups]
+        light = self.lights.get(dest_id)
+        return [light] if light else []
+
+    def handle_pair(self, packet: bytes) -> None:
+        session_random = bytes(packet[1:9])
+        expected = make_pair_packet(self._name, self._password, session_random)
+        if bytes(packet) != bytes(expected):
+            self._pair_response = b'\x0e'
+            return
+
+        response_random = urandom(8)
+        key = make_session_key(self._name, self._password, session_random, response_random)
+        self._crypto = AwoxSessionCrypto(key)
+        self._paired_at = asyncio.get_running_loop().time()
+        self._pair_response = b'\x0d' + response_random
+
+    def handle_command(self, packet: bytes) -> None:
+        self.packets_received += 1
+
+        if self._crypto is None:
+            self.bad_packets += 1
+            return
+
+        sequence = bytes(packet[0:3])
+        nonce = self._crypto.nonce_prefix(self.mac) + b'\x01' + sequence
+        payload = self._crypto.crypt_payload(nonce, packet[5:])
+        if self._crypto.make_checksum(nonce, payload)[0:2] != packet[3:5]:
+            self.bad_packets += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        if random.random() < self.drop_rate or loop.time() - self._paired_at < self.ready_delay:
+            self.packets_dropped += 1
+            return
+
+        dest_id, command = struct.unpack_from("<HB", payload)
+        targets = self._targets(dest_id)
+
+        if command == C_GET_STATUS_SENT:
+            for light in targets:
+                loop.call_later(self.latency, self._send_status, light, True)
+            return
+
+        if command == C_GROUP_EDIT:
+            group_address = struct.unpack_from("<H", payload, 6)[0]
+            for light in targets:
+                if payload[5]:
+                    light.groups.add(group_address)
+                else:
+                    light.groups.discard(group_address)
+            return
+
+        changed = [light for light in targets if light.apply(command, payload[5:])]
+        for light in changed:
+            loop.call_later(self.latency, self._send_status, light)
+
+    def press_remote(self, remote_id: int, command: int, params: bytes) -> None:
+        """Play a remote button: the lights follow it and the hub hears it."""
+        for light in self.lights.values():
+            if light.apply(command, params):
+                asyncio.get_running_loop().call_later(self.latency, self._send_status, light)
+        plain = bytes([command, 0x60, 0x01]) + params.ljust(10, b'\x00')
+        self._send_notification(remote_id, plain[:13])
+
+    def _send_status(self, light: FakeLight, reply: bool = False) -> None:
+        plain = light.status_reply_payload() if reply else light.status_payload()
+        self._send_notification(light.mesh_id, plain)
+
+    def _send_notification(self, mesh_id: int, plain: bytes) -> None:
+        if self._notify is None or self._crypto is None:
+            return
+
+        head = urandom(3) + struct.pack("<H", mesh_id)
+
+        a = bytearray.fromhex(self.mac.replace(":", ""))
+        a.reverse()
+        nonce = bytes(a[0:3]) + head
+
+        check = self._crypto.make_checksum(nonce, plain)
+        self._notify(None, bytearray(head + check[0:2] + self._crypto.crypt_payload(nonce, plain)))
+
+
+class FakeBleakClient:
+    """The part of BleakClient the session uses, backed by a FakeMeshNode."""
+
+    def __init__(self, node: FakeMeshNode, disconnected_callback=None) -> None:
+        self._node = node
+        self._disconnected_callback = disconnected_callback
+        self.address = node.mac
+        self.is_connected = False
+        self.writes = 0
+        self.reads = 0
+
+    async def connect(self) -> None:
+        await asyncio.sleep(self._node.latency)
+        self.is_connected = True
+
+    async def disconnect(self) -> None:
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self._node._notify = None
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    async def read_gatt_char(self, uuid: str) -> bytearray:
+        self.reads += 1
+        await asyncio.sleep(self._node.latency)
+        if uuid == PAIR_CHAR_UUID:
+            return bytearray(self._node._pair_response)
+        return bytearray(1)
+
+    async def write_gatt_char(self, uuid: str, data, response: bool = False) -> None:
+        self.writes += 1
+        # A write with response waits for the round trip
+        await asyncio.sleep(self._node.latency * (2 if response else 1))
+        if uuid == PAIR_CHAR_UUID:
+            self._node.handle_pair(data)
+        elif uuid == COMMAND_CHAR_UUID:
+            self._node.handle_command(data)
+
+    async def start_notify(self, uuid: str, callback) -> None:
+        if uuid == STATUS_CHAR_UUID:
+            self._node._notify = callback
+
+
+def fake_connector(nodes: dict[str, FakeMeshNode]):
+    """Return an AwoxMeshLight connector that opens FakeBleakClients."""
+
+    async def connect(ble_device, disconnected_callback):
+        client = FakeBleakClient(nodes[ble_device.address.upper()], disconnected_callback)
+        await client.connect()
+        return client
+
+    return connect
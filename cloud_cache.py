@@ -0,0 +1,120 @@
+"""On-disk cache of the AwoX cloud inventory."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from .awox_connect import AwoxConnect
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+# A refresh within this many seconds of the last one is served from disk
+REFRESH_INTERVAL = 15 * 60
+
+# Parse cannot report deletions, so the whole inventory is reloaded this often
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+
+class AwoxCloudCache:
+    """Parse Device and Credential objects of one account, keyed by objectId.
+
+    Refreshes only ask the cloud for objects with an updatedAt after the
+    newest one already stored, and are skipped entirely while the cache
+    is fresh.
+    """
+
+    def __init__(self, hass: HomeAssistant, username: str) -> None:
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.cloud.{slugify(username.lower())}")
+        self.devices: dict[str, dict] = {}
+        self.credentials: dict[str, dict] = {}
+        self.last_sync: str | None = None
+        self._last_refresh = 0.0
+        self._last_full_sync = 0.0
+
+    async def async_load(self) -> None:
+        """Read the cache from disk."""
+        data = await self._store.async_load()
+        if not data:
+            return
+
+        self.devices = data.get("devices", {})
+        self.credentials = data.get("credentials", {})
+        self.last_sync = data.get("last_sync")
+        self._last_refresh = data.get("last_refresh", 0.0)
+        self._last_full_sync = data.get("last_full_sync", 0.0)
+
+    @property
+    def is_fresh(self) -> bool:
+        """Return True when the cache can be used without asking the cloud."""
+        return bool(self.credentials) and time.time() - self._last_refresh < REFRESH_INTERVAL
+
+    async def async_refresh(self, awox_connect: AwoxConnect, force: bool = False) -> bool:
+        """Bring the cache up to date, return True when anything changed."""
+        if self.is_fresh and not force:
+            return False
+
+        now = time.time()
+        full = not self.credentials or now - self._last_full_sync > FULL_SYNC_INTERVAL
+
+        devices, credentials = await awox_connect.async_fetch_inventory(
+            None if full else self.last_sync
+        )
+        _LOGGER.info(
+            "%s cloud sync: %d devices, %d credentials changed",
+            "Full" if full else "Incremental",
+            len(devices),
+            len(credentials),
+        )
+
+        if full:
+            changed = (
+                {device["objectId"]: device for device in devices} != self.devices
+                or {credential["objectId"]: credential for credential in credentials} != self.credentials
+            )
+            self.devices = {}
+            self.credentials = {}
+            self._last_full_sync = now
+        else:
+            changed = bool(devices or credentials)
+
+        for device in devices:
+            self.devices[device["objectId"]] = device
+        for credential in credentials:
+            self.credentials[credential["objectId"]] = credential
+
+        updated = [
+            record["updatedAt"]
+            for record in (*self.devices.values(), *self.credentials.values())
+            if "updatedAt" in record
+        ]
+        # Parse dates are ISO 8601 in UTC, they sort as strings
+        self.last_sync = max(updated) if updated else None
+        self._last_refresh = now
+
+        await self._store.async_save(
+            {
+                "devices": self.devices,
+                "credentials": self.credentials,
+                "last_sync": self.last_sync,
+                "last_refresh": self._last_refresh,
+                "last_full_sync": self._last_full_sync,
+            }
+        )
+
+        return changed
+
+    def credential(self) -> dict | None:
+        """Return the mesh credential of the account, the oldest one if several."""
+        if not self.credentials:
+            return None
+        return min(self.credentials.values(), key=lambda credential: credential.get("createdAt", ""))
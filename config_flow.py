@@ -6,19 +6,37 @@ import logging
 import voluptuous as vol
 
 from homeassistant import config_entries
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.const import (
     CONF_USERNAME,
     CONF_PASSWORD
 )
 
-from .const import DOMAIN, CONF_MESH_NAME, CONF_MESH_PASSWORD, CONF_MESH_KEY
-from .awox_connect import AwoxConnect
+from .const import (
+    DOMAIN,
+    CONF_MESH_NAME,
+    CONF_MESH_PASSWORD,
+    CONF_MESH_KEY,
+    CONF_AWOX_CONNECT,
+    CONF_COMMAND_INTERVAL,
+    CONF_METRICS,
+    CONF_WRITE_WITHOUT_RESPONSE,
+    DEFAULT_COMMAND_INTERVAL,
+)
+from .cloud_cache import AwoxCloudCache
+from .inventory import device_entry_from_cloud
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def create_awox_connect_object(username, password) -> AwoxConnect:
-    return AwoxConnect(username, password)
+async def async_create_awox_connect_object(hass, username, password):
+    # The cloud client is only needed while setting up an entry
+    from .awox_connect import AwoxConnect
+
+    awox_connect = AwoxConnect(async_get_clientsession(hass), username, password)
+    await awox_connect.async_login()
+    return awox_connect
 
 class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a Awox config flow."""
@@ -43,6 +61,8 @@ class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         username: str = ''
         password: str = ''
         awox_connect = None
+        cloud_devices = None
+        credentials = None
 
         if user_input is not None:
             username = user_input.get(CONF_USERNAME)
@@ -53,12 +73,21 @@ class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 _LOGGER.info('Trying to login to AwoX Smart Connect...')
                 _LOGGER.info('Username: %s', username)
                 
-                awox_connect = await self.hass.async_add_executor_job(create_awox_connect_object, username, password)
+                awox_connect = await async_create_awox_connect_object(self.hass, username, password)
+
+                cache = AwoxCloudCache(self.hass, username)
+                await cache.async_load()
+                await cache.async_refresh(awox_connect)
+
+                cloud_devices = list(cache.devices.values())
+                credentials = cache.credential()
+                if credentials is None:
+                    raise Exception('No mesh credentials in this account')
             except Exception as e:
                 _LOGGER.error('Can not login to AwoX Smart Connect [%s]', e)
                 errors[CONF_PASSWORD] = 'cannot_connect'
 
-        if user_input is None or awox_connect is None or errors:
+        if user_input is None or credentials is None or errors:
             return self.async_show_form(
                 step_id="awox_connect",
                 data_schema=vol.Schema({
@@ -69,54 +98,23 @@ class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             )
 
         devices = []
-        for device in await self.hass.async_add_executor_job(awox_connect.devices):
+        for device in cloud_devices:
             _LOGGER.info('Processing device - %s', device)
-            if 'type' not in device:
-                _LOGGER.warning('Skipped device, missing type - %s', device)
-                continue
-            if 'address' not in device or not device['address']:
-                _LOGGER.warning('Skipped device, missing address - %s', device)
-                continue
-            if 'macAddress' not in device:
-                _LOGGER.warning('Skipped device, missing macAddress - %s', device)
-                continue
-            if 'displayName' not in device:
-                _LOGGER.warning('Skipped device, missing displayName - %s', device)
-                continue
-
-            if 'modelName' not in device:
-                device['modelName'] = 'unknown'
-            if 'vendor' not in device:
-                device['vendor'] = 'unknown'
-            if 'version' not in device:
-                device['version'] = 'unknown'
-            if 'hardwareVersion' not in device:
-                device['hardwareVersion'] = None
-
-            devices.append({
-                'mesh_id': int(device['address']),
-                'name': device['displayName'],
-                'mac': device['macAddress'],
-                'model': device['modelName'],
-                'manufacturer': device['vendor'],
-                'firmware': device['version'],
-                'hardware': device['hardwareVersion'],
-                'type': device['type']
-            })
+            entry = device_entry_from_cloud(device)
+            if entry is not None:
+                devices.append(entry)
 
         if len(devices) == 0:
             return self.async_abort(reason="no_devices_found")
 
-        credentials = await self.hass.async_add_executor_job(awox_connect.credentials)
-
         data = {
             CONF_MESH_NAME: credentials['client_id'],
             CONF_MESH_PASSWORD: credentials['access_token'],
             CONF_MESH_KEY: credentials['refresh_token'],
-            # 'awox_connect': {
-            #     CONF_USERNAME: user_input[CONF_USERNAME],
-            #     CONF_PASSWORD: user_input[CONF_PASSWORD]
-            # },
+            CONF_AWOX_CONNECT: {
+                CONF_USERNAME: user_input[CONF_USERNAME],
+                CONF_PASSWORD: user_input[CONF_PASSWORD]
+            },
             'devices': devices
         }
 
@@ -165,11 +163,11 @@ class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         """Forward result of device select form to step user"""
         return await self.async_step_user(user_input)
 
-    # @staticmethod
-    # @callback
-    # def async_get_options_flow(config_entry):
-    #     """Define the config flow to handle options."""
-    #     return UpnpOptionsFlowHandler(config_entry)
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Define the config flow to handle options."""
+        return AwoxOptionsFlowHandler(config_entry)
 
     async def _async_create_entry_from_discovery(
             self,
@@ -198,4 +196,35 @@ class AwoxMeshFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             ]
         }
 
-        return self.async_create_entry(title=name, data=data)
\ No newline at end of file
+        return self.async_create_entry(title=name, data=data)
+
+
+class AwoxOptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Awox options."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self._entry = config_entry
+
+    async def async_step_init(self, user_input: Optional[Mapping] = None):
+
+        if user_input is not None:
+            return self.async_create_entry(title='', data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                vol.Required(
+                    CONF_COMMAND_INTERVAL,
+                    default=self._entry.options.get(CONF_COMMAND_INTERVAL, DEFAULT_COMMAND_INTERVAL),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=2)),
+                vol.Required(
+                    CONF_WRITE_WITHOUT_RESPONSE,
+                    default=self._entry.options.get(CONF_WRITE_WITHOUT_RESPONSE, False),
+                ): bool,
+                vol.Required(
+                    CONF_METRICS,
+                    default=self._entry.options.get(CONF_METRICS, False),
+                ): bool,
+            }),
+        )
@@ -0,0 +1,178 @@
+"""BLE connection slots shared by every AwoX entry, per Bluetooth adapter."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Connections one adapter or proxy holds at once, most take 3 to 5
+ADAPTER_CONNECTION_SLOTS = 3
+
+# Who waits for a slot, lower goes first
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_OTA = 2
+# Speculative standby links only take a slot nobody else wants
+PRIORITY_STANDBY = 3
+
+# Seconds between two requests to the holders of a full adapter to give a
+# slot back, while a waiter is not served
+PREEMPT_INTERVAL = 1.0
+
+
+def adapter_of(ble_device) -> str | None:
+    """Return the adapter or proxy a BLE device is reached through."""
+    details = getattr(ble_device, "details", None)
+    if isinstance(details, dict):
+        return details.get("source")
+    return None
+
+
+class ConnectionSlot:
+    """One connection granted on an adapter, release it when done."""
+
+    __slots__ = ("adapter", "priority", "on_preempt", "yielding", "_budget")
+
+    def __init__(
+        self, budget: AwoxConnectionBudget, adapter: str | None, priority: int, on_preempt=None
+    ) -> None:
+        self._budget = budget
+        self.adapter = adapter
+        self.priority = priority
+        # Called with the priority of a waiter when the adapter is full,
+        # returns True when the holder gives the slot back for it
+        self.on_preempt = on_preempt
+        self.yielding = False
+
+    def release(self) -> None:
+        """Give the slot back, safe to call more than once."""
+        if self._budget is not None:
+            budget, self._budget = self._budget, None
+            budget._release(self)
+
+
+class AwoxConnectionBudget:
+    """Limit the BLE connections open at once on each adapter.
+
+    Every hub session and firmware update takes a slot before connecting
+    and gives it back on disconnect. When an adapter is full, waiters are
+    served by priority, user commands before background reconnects before
+    firmware updates before standby links, and in arrival order within a
+    priority.
+
+    Holders may also give their slot back: a waiter that cannot be served
+    asks them, lowest priority first, until one of them yields. Links kept
+    open on speculation or while idle make room for a command that way.
+    """
+
+    def __init__(self, slots: int = ADAPTER_CONNECTION_SLOTS) -> None:
+        self.slots = slots
+        self._in_use: dict[str | None, int] = {}
+        self._held: dict[str | None, set[ConnectionSlot]] = {}
+        # Per adapter heap of (priority, arrival, future)
+        self._waiters: dict[str | None, list] = {}
+        self._arrival = itertools.count()
+
+    def in_use(self, adapter: str | None) -> int:
+        """Return the connections open on an adapter."""
+        return self._in_use.get(adapter, 0)
+
+    def has_free_slot(self, adapter: str | None) -> bool:
+        """Return True when a slot is free on the adapter and nobody waits for it."""
+        return self.in_use(adapter) < self.slots and not self._waiters.get(adapter)
+
+    def has_waiter(self, adapter: str | None) -> bool:
+        """Return True when someone waits for a slot on the adapter."""
+        return bool(self._waiters.get(adapter))
+
+    async def async_acquire(
+        self, adapter: str | None, priority: int, on_preempt=None
+    ) -> ConnectionSlot:
+        """Wait for a free connection slot on the adapter.
+
+        on_preempt is called when a waiter of the adapter wants the slot,
+        see ConnectionSlot.
+        """
+        if self.has_free_slot(adapter):
+            self._in_use[adapter] = self.in_use(adapter) + 1
+            return self._grant(adapter, priority, on_preempt)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._arrival), future)
+        heapq.heappush(self._waiters.setdefault(adapter, []), entry)
+        _LOGGER.debug(
+            "Waiting for a connection slot on %s (priority %d, %d in use)",
+            adapter,
+            priority,
+            self.in_use(adapter),
+        )
+
+        try:
+            while not future.done():
+                self._preempt(adapter)
+                await asyncio.wait((future,), timeout=PREEMPT_INTERVAL)
+        except asyncio.CancelledError:
+            if future.done():
+                # Granted while being cancelled, pass it on
+                self._pass_on(adapter)
+            else:
+                future.cancel()
+                waiters = self._waiters.get(adapter, [])
+                if entry in waiters:
+                    waiters.remove(entry)
+                    heapq.heapify(waiters)
+            raise
+
+        return self._grant(adapter, priority, on_preempt)
+
+    def _grant(self, adapter: str | None, priority: int, on_preempt) -> ConnectionSlot:
+        slot = ConnectionSlot(self, adapter, priority, on_preempt)
+        self._held.setdefault(adapter, set()).add(slot)
+        return slot
+
+    def _preempt(self, adapter: str | None) -> None:
+        """Ask holders to give a slot back, one per waiter not yet covered."""
+        waiters = [
+            priority for priority, _, future in self._waiters.get(adapter, ()) if not future.done()
+        ]
+        held = self._held.get(adapter, set())
+        wanted = len(waiters) - sum(slot.yielding for slot in held)
+        if wanted <= 0:
+            return
+
+        best = min(waiters)
+        for slot in sorted(held, key=lambda slot: slot.priority, reverse=True):
+            if slot.yielding or slot.on_preempt is None or not slot.on_preempt(best):
+                continue
+            slot.yielding = True
+            _LOGGER.debug(
+                "Slot of priority %d on %s given up for priority %d", slot.priority, adapter, best
+            )
+            wanted -= 1
+            if wanted == 0:
+                return
+
+    def _release(self, slot: ConnectionSlot) -> None:
+        self._held.get(slot.adapter, set()).discard(slot)
+        self._pass_on(slot.adapter)
+
+    def _pass_on(self, adapter: str | None) -> None:
+        waiters = self._waiters.get(adapter)
+        while waiters:
+            _, _, future = heapq.heappop(waiters)
+            if not future.done():
+                # The slot goes straight to the waiter, in_use is unchanged
+                future.set_result(None)
+                return
+
+        self._in_use[adapter] = max(self.in_use(adapter) - 1, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            "slots": self.slots,
+            "in_use": {str(adapter): count for adapter, count in self._in_use.items()},
+            "waiting": {str(adapter): len(waiters) for adapter, waiters in self._waiters.items()},
+        }
@@ -10,4 +10,22 @@ CONF_MESH_ID = 'mesh_id'
 CONFIG_DEVICES = 'devices'
 CONF_MANUFACTURER = 'manufacturer'
 CONF_MODEL = 'model'
-CONF_FIRMWARE = 'firmware'
\ No newline at end of file
+CONF_FIRMWARE = 'firmware'
+CONF_AWOX_CONNECT = 'awox_connect'
+
+# Mesh groups assigned to the rooms of the AwoX app
+CONF_GROUPS = 'groups'
+
+# Key of the connection budget shared by the entries in hass.data[DOMAIN]
+DATA_CONNECTION_BUDGET = 'connection_budget'
+
+CONF_COMMAND_INTERVAL = 'command_interval'
+
+# Seconds between two packets, the mesh drops commands sent faster
+DEFAULT_COMMAND_INTERVAL = 0.1
+
+# Write commands without response, confirmed by the lights' status reports
+CONF_WRITE_WITHOUT_RESPONSE = 'write_without_response'
+
+# Collect connection and queue metrics, off by default to keep the hot path lean
+CONF_METRICS = 'metrics'
@@ -0,0 +1,35 @@
+"""Diagnostics support for AwoX MESH lights."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    CONF_AWOX_CONNECT,
+    CONF_MESH_KEY,
+    CONF_MESH_PASSWORD,
+    DATA_CONNECTION_BUDGET,
+    DOMAIN,
+)
+
+TO_REDACT = {CONF_MESH_PASSWORD, CONF_MESH_KEY, CONF_AWOX_CONNECT}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    mesh = hass.data[DOMAIN][entry.entry_id]
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "hub": mesh.diagnostics(),
+        "scenes": mesh.scenes.scenes,
+        "connection_budget": hass.data[DOMAIN][DATA_CONNECTION_BUDGET].as_dict(),
+    }
@@ -0,0 +1,211 @@
+"""Transitions and effects, played on many lights at a fixed frame rate."""
+from __future__ import annotations
+
+import asyncio
+import colorsys
+import logging
+import math
+from collections.abc import Callable, Iterable
+
+from homeassistant.core import HomeAssistant
+
+from .awox import AwoxMeshLight
+from .protocol import (
+    C_COLOR,
+    C_COLOR_BRIGHTNESS,
+    C_WHITE_BRIGHTNESS,
+    C_WHITE_TEMPERATURE,
+    encode_color,
+    encode_color_brightness,
+    encode_white_brightness,
+    encode_white_temperature,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between two frames. A frame costs one packet per distinct value,
+# the mesh relays about ten packets a second
+FRAME_INTERVAL = 0.2
+
+EFFECT_COLORLOOP = "Color loop"
+EFFECT_BREATHE = "Breathe"
+
+# Seconds for one full hue turn and one breath
+COLORLOOP_PERIOD = 30.0
+BREATHE_PERIOD = 4.0
+
+# Commands a transition can interpolate, with their encoders
+ENCODERS: dict[int, Callable[..., tuple[int, bytes]]] = {
+    C_COLOR: encode_color,
+    C_COLOR_BRIGHTNESS: encode_color_brightness,
+    C_WHITE_BRIGHTNESS: encode_white_brightness,
+    C_WHITE_TEMPERATURE: encode_white_temperature,
+}
+
+# A frame: the (command, data) pairs to send to one light
+Frame = list[tuple[int, bytes]]
+
+
+def colorloop_frame(elapsed: float) -> Frame:
+    """Return the color loop frame at elapsed seconds."""
+    hue = (elapsed / COLORLOOP_PERIOD) % 1.0
+    red, green, blue = colorsys.hsv_to_rgb(hue, 1.0, 1.0)
+    return [encode_color(red * 255, green * 255, blue * 255)]
+
+
+def breathe_frame(command: int, low: int, high: int) -> Callable[[float], Frame]:
+    """Return a frame function swinging a brightness command between low and high."""
+    encoder = ENCODERS[command]
+
+    def frame(elapsed: float) -> Frame:
+        level = (1 - math.cos(2 * math.pi * elapsed / BREATHE_PERIOD)) / 2
+        return [encoder(round(low + (high - low) * level))]
+
+    return frame
+
+
+class _Animation:
+    """What one light plays: a transition with an end, or an endless effect."""
+
+    __slots__ = ("frame", "start", "duration", "initial", "final", "last_sent")
+
+    def __init__(
+        self,
+        frame: Callable[[float], Frame],
+        start: float,
+        duration: float | None,
+        initial: Frame,
+        final: Frame,
+    ) -> None:
+        self.frame = frame
+        self.start = start
+        self.duration = duration
+        # Commands sent after the first frame and once the transition is over
+        self.initial = initial
+        self.final = final
+        # Data last queued per command, unchanged values are not sent again
+        self.last_sent: dict[int, bytes] = {}
+
+
+class AwoxEffectEngine:
+    """Play transitions and effects on the lights of one hub.
+
+    Every tick, the frame of each playing light is computed from the time
+    elapsed and the whole batch is queued at once, so the command queue
+    can merge identical values into group or broadcast packets. A tick
+    whose previous frame is still being sent is dropped; frames follow the
+    clock, so a late mesh skips values instead of lagging behind.
+
+    Effects run on a shared clock, lights playing the same effect show the
+    same values and share packets.
+    """
+
+    def __init__(self, hass: HomeAssistant, mesh: AwoxMeshLight) -> None:
+        self.hass = hass
+        self._mesh = mesh
+        self._animations: dict[int, _Animation] = {}
+        self._task: asyncio.Task | None = None
+        self._frame: asyncio.Future | None = None
+        self._epoch = hass.loop.time()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def is_playing(self, mesh_id: int) -> bool:
+        """Return True when a transition or an effect runs on the light."""
+        return mesh_id in self._animations
+
+    def start_transition(
+        self,
+        mesh_id: int,
+        channels: dict[int, tuple[tuple[int, ...], tuple[int, ...]]],
+        duration: float,
+        initial: Frame = (),
+        final: Frame = (),
+    ) -> None:
+        """Fade a light, channels maps commands to (start, end) values.
+
+        initial is sent right after the first frame, e.g. to power on a
+        light already set to its starting level, final after the last one.
+        """
+        encoders = [(ENCODERS[command], start, end) for command, (start, end) in channels.items()]
+
+        def frame(elapsed: float) -> Frame:
+            progress = min(elapsed / duration, 1.0) if duration > 0 else 1.0
+            return [
+                encoder(*(round(a + (b - a) * progress) for a, b in zip(start, end)))
+                for encoder, start, end in encoders
+            ]
+
+        self._play(
+            mesh_id,
+            _Animation(frame, self.hass.loop.time(), duration, list(initial), list(final)),
+        )
+
+    def start_effect(self, mesh_id: int, frame: Callable[[float], Frame]) -> None:
+        """Play an endless effect on a light, until it is cancelled."""
+        self._play(mesh_id, _Animation(frame, self._epoch, None, [], []))
+
+    def cancel(self, mesh_ids: Iterable[int]) -> None:
+        """Stop what the lights play, where they are."""
+        for mesh_id in mesh_ids:
+            self._animations.pop(mesh_id, None)
+
+    def stop(self) -> None:
+        """Stop every animation and the frame loop."""
+        self._animations.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _play(self, mesh_id: int, animation: _Animation) -> None:
+        self._animations[mesh_id] = animation
+        if self._task is None:
+            self._task = self.hass.async_create_background_task(
+                self._async_run(), "awox effects"
+            )
+
+    async def _async_run(self) -> None:
+        """Queue one frame per tick while something plays."""
+        loop = self.hass.loop
+        try:
+            while self._animations:
+                tick = loop.time()
+
+                if self._frame is not None and not self._frame.done():
+                    self.frames_dropped += 1
+                    self._mesh.metrics.increment("frames_dropped")
+                else:
+                    self._frame = self._queue_frame(tick)
+
+                await asyncio.sleep(max(FRAME_INTERVAL - (loop.time() - tick), 0))
+        finally:
+            self._task = None
+
+    def _queue_frame(self, now: float) -> asyncio.Future | None:
+        """Queue the commands of every playing light for this tick."""
+        sends = []
+
+        for mesh_id, animation in list(self._animations.items()):
+            elapsed = now - animation.start
+            commands = animation.frame(elapsed)
+            if not animation.last_sent:
+                commands = commands + animation.initial
+
+            done = animation.duration is not None and elapsed >= animation.duration
+            if done:
+                commands = commands + animation.final
+                del self._animations[mesh_id]
+
+            for command, data in commands:
+                if animation.last_sent.get(command) == data and not done:
+                    continue
+                animation.last_sent[command] = data
+                sends.append(self._mesh.async_queue_command(command, data, mesh_id))
+
+        if not sends:
+            return None
+
+        self.frames_sent += 1
+        self._mesh.metrics.increment("frames_sent")
+        # Results only tell when the frame is out, failures show in the queue
+        return asyncio.gather(*sends, return_exceptions=True)
@@ -0,0 +1,84 @@
+"""Platform for the button presses of AwoX/EGLO mesh remotes."""
+from __future__ import annotations
+
+import logging
+
+from homeassistant.components.event import EventDeviceClass, EventEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_DEVICES, CONF_MAC, CONF_NAME
+from homeassistant.core import HomeAssistant, callback
+
+from .awox import AwoxMeshLight
+from .const import CONF_MESH_ID, DOMAIN
+from .protocol import REMOTE_EVENT_TYPES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def is_remote(device_type: str) -> bool:
+    """Return True for the remote controls of the mesh, e.g. .ble.tlmesh.sensor.rcu."""
+    return ".rcu." in device_type
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities
+) -> None:
+    """Set up an event entity per AwoX remote."""
+    mesh = hass.data[DOMAIN][entry.entry_id]
+    known_mesh_ids: set[int] = set()
+
+    @callback
+    def async_add_new_remotes(devices: list[dict]) -> None:
+        """Add entities for the remotes not seen yet."""
+        remotes = []
+        for device in devices:
+            if not is_remote(device.get("type", "")):
+                continue
+            if device[CONF_MESH_ID] in known_mesh_ids:
+                continue
+            known_mesh_ids.add(device[CONF_MESH_ID])
+
+            _LOGGER.info(" :: Setup remote [%d] %s", device[CONF_MESH_ID], device[CONF_NAME])
+            remotes.append(
+                AwoxRemoteEvent(mesh, device[CONF_MAC], device[CONF_MESH_ID], device[CONF_NAME])
+            )
+
+        if remotes:
+            async_add_entities(remotes)
+
+    async_add_new_remotes(entry.data[CONF_DEVICES])
+    entry.async_on_unload(mesh.async_subscribe_devices(async_add_new_remotes))
+
+
+class AwoxRemoteEvent(EventEntity):
+    """Button presses of an AwoX remote, as relayed by the mesh.
+
+    The remote talks to the lights directly; the commands it sends reach
+    the hub in the status notification stream, so an event fires as soon
+    as the notification is decoded.
+    """
+
+    _attr_should_poll = False
+    _attr_device_class = EventDeviceClass.BUTTON
+    _attr_event_types = REMOTE_EVENT_TYPES
+
+    def __init__(self, coordinator: AwoxMeshLight, mac: str, mesh_id: int, name: str) -> None:
+        """Initialize the events of a remote."""
+        self._mesh = coordinator
+        self._mesh_id = mesh_id
+
+        self._attr_name = name
+        self._attr_unique_id = f"awoxmesh-{mac.lower()}-{mesh_id}"
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the button presses of this remote."""
+        self.async_on_remove(
+            self._mesh.async_subscribe_remote(self._mesh_id, self._handle_remote_event)
+        )
+
+    @callback
+    def _handle_remote_event(self, event: dict) -> None:
+        """Fire the event of a button press."""
+        attributes = {"value": event["value"]} if "value" in event else None
+        self._trigger_event(event["event_type"], attributes)
+        self.async_write_ha_state()
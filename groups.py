@@ -0,0 +1,205 @@
+"""Mesh groups built from the rooms of the AwoX app."""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_DEVICES
+from homeassistant.core import HomeAssistant, callback
+
+from .awox import AwoxMeshLight
+from .const import CONF_GROUPS
+from .protocol import encode_group_edit
+
+_LOGGER = logging.getLogger(__name__)
+
+# First group address handed out, the AwoX app leaves groups unused
+GROUP_ADDRESS_START = 0x8001
+GROUP_ADDRESS_END = 0x80FF
+
+
+def assign_groups(devices: list[dict], groups: list[dict]) -> list[dict]:
+    """Return the groups of the entry for the rooms of devices.
+
+    A room keeps the address it was given first, new rooms take the lowest
+    free one. Members are the lights of the room; provisioned, the nodes
+    that already joined the group, is carried over. Rooms left without
+    members are kept until no node is provisioned anymore.
+    """
+    known = {group["room_id"]: group for group in groups}
+    rooms: dict[str, dict] = {}
+
+    for device in devices:
+        room_id = device.get("room_id")
+        if not room_id or "light" not in device.get("type", ""):
+            continue
+        room = rooms.setdefault(room_id, {"name": device.get("room") or room_id, "members": set()})
+        room["members"].add(device["mesh_id"])
+
+    used = {group["address"] for group in groups}
+    result = []
+
+    for room_id in sorted(set(known) | set(rooms)):
+        group = known.get(room_id)
+        room = rooms.get(room_id)
+
+        if group is None:
+            address = next(
+                (a for a in range(GROUP_ADDRESS_START, GROUP_ADDRESS_END + 1) if a not in used),
+                None,
+            )
+            if address is None:
+                _LOGGER.warning("No mesh group address left for room %s", room["name"])
+                continue
+            used.add(address)
+            group = {"room_id": room_id, "address": address, "provisioned": []}
+
+        if room is None and not group["provisioned"]:
+            continue
+
+        result.append({
+            "room_id": room_id,
+            "name": room["name"] if room else group["name"],
+            "address": group["address"],
+            "members": sorted(room["members"]) if room else [],
+            "provisioned": list(group["provisioned"]),
+        })
+
+    return result
+
+
+async def async_provision_groups(hass: HomeAssistant, entry: ConfigEntry, mesh: AwoxMeshLight) -> None:
+    """Bring the group membership of the nodes in line with the entry's rooms.
+
+    Only nodes heard recently are edited, the others are tried again on
+    the next run. A written join only proves the gateway got it, so the
+    joins of provisioned members are sent again on every run; joining
+    twice is harmless. The result is saved in the entry and handed to the
+    hub.
+    """
+    groups = assign_groups(entry.data.get(CONF_DEVICES, []), entry.data.get(CONF_GROUPS, []))
+
+    # Per node edits, removals first so a node can move between rooms
+    edits: dict[int, list[tuple[dict, bool]]] = {}
+    for group in groups:
+        members = set(group["members"])
+        provisioned = set(group["provisioned"])
+
+        for mesh_id in sorted(provisioned - members):
+            if mesh.node(mesh_id) is None:
+                # Gone from the mesh, nothing left to edit
+                group["provisioned"].remove(mesh_id)
+            elif mesh.is_available(mesh_id):
+                edits.setdefault(mesh_id, []).insert(0, (group, False))
+
+        for mesh_id in sorted(members):
+            if mesh.is_available(mesh_id):
+                edits.setdefault(mesh_id, []).append((group, True))
+
+    if edits:
+        _LOGGER.debug("Provisioning %d mesh group memberships", sum(map(len, edits.values())))
+
+    # Nodes joining the same group share packets
+    results = await mesh.async_queue_each({
+        mesh_id: [encode_group_edit(group["address"], add) for group, add in node_edits]
+        for mesh_id, node_edits in edits.items()
+    })
+
+    for mesh_id, node_edits in edits.items():
+        for (group, add), resp in zip(node_edits, results[mesh_id]):
+            if not resp:
+                continue
+            if add:
+                if mesh_id not in group["provisioned"]:
+                    group["provisioned"].append(mesh_id)
+            else:
+                group["provisioned"].remove(mesh_id)
+
+    for group in groups:
+        group["provisioned"].sort()
+    groups = [group for group in groups if group["members"] or group["provisioned"]]
+
+    if groups != entry.data.get(CONF_GROUPS, []):
+        hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_GROUPS: groups})
+
+    mesh.async_update_groups(groups)
+
+
+def pending_edits(groups: list[dict]) -> set[int]:
+    """Return the mesh ids that still have to join or leave a group."""
+    pending = set()
+    for group in groups:
+        members = set(group["members"])
+        provisioned = set(group["provisioned"])
+        pending |= (members - provisioned) | (provisioned - members)
+    return pending
+
+
+class AwoxGroupProvisioner:
+    """Provision the mesh groups again when a node still to edit is heard.
+
+    The run at setup comes before the first connection, when only nodes
+    advertising nearby count as available, and the inventory reconciler
+    only runs for entries with a cloud login. Nodes reached through the
+    mesh would otherwise wait for a restart. A node that stays available
+    after a failed edit is not tried again until it was gone in between.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, mesh: AwoxMeshLight) -> None:
+        self._hass = hass
+        self._entry = entry
+        self._mesh = mesh
+        self._lock = asyncio.Lock()
+        self._scheduled = False
+        # Mesh id -> presence unsubscribe of the nodes still to edit
+        self._unsubscribes: dict[int, callable] = {}
+        self._available: set[int] = set()
+
+    @callback
+    def async_start(self) -> None:
+        """Provision now and whenever a node still to edit comes back."""
+        self.async_schedule()
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following the nodes still to edit."""
+        for unsubscribe in self._unsubscribes.values():
+            unsubscribe()
+        self._unsubscribes.clear()
+        self._available.clear()
+
+    @callback
+    def async_schedule(self) -> None:
+        """Run provisioning in the background, unless a run is already waiting."""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        self._entry.async_create_background_task(
+            self._hass, self.async_provision(), "awox group provisioning"
+        )
+
+    async def async_provision(self) -> None:
+        """Run provisioning, one run at a time."""
+        async with self._lock:
+            self._scheduled = False
+            await async_provision_groups(self._hass, self._entry, self._mesh)
+            self._follow(pending_edits(self._entry.data.get(CONF_GROUPS, [])))
+
+    def _follow(self, mesh_ids: set[int]) -> None:
+        for mesh_id in set(self._unsubscribes) - mesh_ids:
+            self._unsubscribes.pop(mesh_id)()
+        for mesh_id in mesh_ids - set(self._unsubscribes):
+            self._unsubscribes[mesh_id] = self._mesh.async_subscribe_presence(
+                mesh_id, lambda mesh_id=mesh_id: self._presence_changed(mesh_id)
+            )
+        self._available = {mesh_id for mesh_id in mesh_ids if self._mesh.is_available(mesh_id)}
+
+    @callback
+    def _presence_changed(self, mesh_id: int) -> None:
+        if not self._mesh.is_available(mesh_id):
+            self._available.discard(mesh_id)
+        elif mesh_id in self._unsubscribes and mesh_id not in self._available:
+            self._available.add(mesh_id)
+            _LOGGER.debug("Node %d is back, provisioning its mesh groups", mesh_id)
+            self.async_schedule()
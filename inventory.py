@@ -0,0 +1,150 @@
+"""Reconcile the configured devices with the AwoX cloud inventory."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_DEVICES, CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+
+from .awox import AwoxMeshLight
+from .cloud_cache import AwoxCloudCache
+from .const import CONF_AWOX_CONNECT
+from .ota import parse_version
+
+_LOGGER = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = timedelta(hours=1)
+
+
+def device_entry_from_cloud(device: dict) -> dict | None:
+    """Return the config entry form of a cloud Device, None if it is unusable."""
+    if 'type' not in device:
+        _LOGGER.warning('Skipped device, missing type - %s', device)
+        return None
+    if 'address' not in device or not device['address']:
+        _LOGGER.warning('Skipped device, missing address - %s', device)
+        return None
+    if 'macAddress' not in device:
+        _LOGGER.warning('Skipped device, missing macAddress - %s', device)
+        return None
+    if 'displayName' not in device:
+        _LOGGER.warning('Skipped device, missing displayName - %s', device)
+        return None
+
+    return {
+        'mesh_id': int(device['address']),
+        'name': device['displayName'],
+        'mac': device['macAddress'],
+        'model': device.get('modelName', 'unknown'),
+        'manufacturer': device.get('vendor', 'unknown'),
+        'firmware': device.get('version', 'unknown'),
+        'hardware': device.get('hardwareVersion'),
+        'type': device['type'],
+        'room': device.get('room'),
+        'room_id': (device.get('typedRoom') or {}).get('objectId'),
+    }
+
+
+class AwoxInventoryReconciler:
+    """Keep the entry's devices in line with the cloud, without a reload.
+
+    New mesh ids are handed to the hub, which adds their entities; mesh ids
+    gone from the cloud are marked removed and their entities become
+    unavailable. The BLE session is left alone. Mesh groups follow the
+    rooms after every run.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, mesh: AwoxMeshLight) -> None:
+        self._hass = hass
+        self._entry = entry
+        self._mesh = mesh
+        self._cache: AwoxCloudCache | None = None
+        self._lock = asyncio.Lock()
+        self._unsubscribe = None
+
+    @property
+    def has_credentials(self) -> bool:
+        """Return True when the entry keeps the cloud login."""
+        return CONF_AWOX_CONNECT in self._entry.data
+
+    def async_start(self) -> None:
+        """Reconcile periodically."""
+        if not self.has_credentials:
+            _LOGGER.info("No AwoX Smart Connect login in entry, devices are not synced")
+            return
+
+        self._unsubscribe = async_track_time_interval(
+            self._hass, self._async_reconcile_interval, RECONCILE_INTERVAL
+        )
+
+    def async_stop(self) -> None:
+        """Stop the periodic reconciliation."""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    async def _async_reconcile_interval(self, now=None) -> None:
+        try:
+            await self.async_reconcile()
+        except Exception as e:
+            _LOGGER.info("Device sync failed: %s", e)
+
+    async def async_reconcile(self, force: bool = False) -> None:
+        """Fetch the cloud inventory and apply the differences."""
+        if not self.has_credentials:
+            return
+
+        async with self._lock:
+            await self._async_sync_devices(force)
+            # Also picks up the nodes that were out of reach last time
+            await self._mesh.provisioner.async_provision()
+
+    async def _async_sync_devices(self, force: bool) -> None:
+        """Apply the cloud device list to the entry and the hub."""
+        login = self._entry.data[CONF_AWOX_CONNECT]
+
+        if self._cache is None:
+            self._cache = AwoxCloudCache(self._hass, login[CONF_USERNAME])
+            await self._cache.async_load()
+
+        from .awox_connect import AwoxConnect
+
+        awox_connect = AwoxConnect(
+            async_get_clientsession(self._hass), login[CONF_USERNAME], login[CONF_PASSWORD]
+        )
+        await self._cache.async_refresh(awox_connect, force)
+
+        devices = [
+            entry
+            for entry in map(device_entry_from_cloud, self._cache.devices.values())
+            if entry is not None
+        ]
+        if not devices:
+            _LOGGER.info("Cloud returned no usable device, keeping the current ones")
+            return
+
+        current = self._entry.data.get(CONF_DEVICES, [])
+
+        # The cloud learns of a local firmware update late, keep the newer version
+        flashed = {d['mesh_id']: d.get('firmware') for d in current}
+        for device in devices:
+            version = flashed.get(device['mesh_id'])
+            if parse_version(version) > parse_version(device['firmware']):
+                device['firmware'] = version
+
+        if sorted(devices, key=lambda d: d['mesh_id']) == sorted(current, key=lambda d: d['mesh_id']):
+            return
+
+        added = {d['mesh_id'] for d in devices} - {d['mesh_id'] for d in current}
+        removed = {d['mesh_id'] for d in current} - {d['mesh_id'] for d in devices}
+        _LOGGER.info("Device sync: added %s, removed %s", sorted(added), sorted(removed))
+
+        self._hass.config_entries.async_update_entry(
+            self._entry, data={**self._entry.data, CONF_DEVICES: devices}
+        )
+        self._mesh.async_update_devices(devices)
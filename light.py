@@ -1,20 +1,50 @@
 """Platform for light integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
 from typing import Any
 
-from homeassistant.components import bluetooth
-from homeassistant.components.light import ATTR_BRIGHTNESS, ColorMode, LightEntity
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_EFFECT,
+    ATTR_RGB_COLOR,
+    ATTR_TRANSITION,
+    EFFECT_OFF,
+    ColorMode,
+    LightEntity,
+    LightEntityFeature,
+)
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_DEVICES, CONF_MAC, CONF_NAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 from .awox import AwoxMeshLight
 from .const import CONF_FIRMWARE, CONF_MANUFACTURER, CONF_MESH_ID, CONF_MODEL, DOMAIN
+from .effects import EFFECT_BREATHE, EFFECT_COLORLOOP, breathe_frame, colorloop_frame
+from .protocol import (
+    C_COLOR,
+    C_COLOR_BRIGHTNESS,
+    C_WHITE_BRIGHTNESS,
+    C_WHITE_TEMPERATURE,
+    PRESET_COUNT,
+    encode_color,
+    encode_color_brightness,
+    encode_power,
+    encode_preset,
+    encode_white_brightness,
+    encode_white_temperature,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+MIN_COLOR_TEMP_KELVIN = 2700
+MAX_COLOR_TEMP_KELVIN = 6500
+
+# Effects the RGB lights play on their own, by preset number
+PRESET_EFFECTS = {f"Preset {preset + 1}": preset for preset in range(PRESET_COUNT)}
+
 
 def _supported_color_modes(device_type: str) -> set[ColorMode]:
     """Return supported Home Assistant color modes for an AwoX device type."""
@@ -37,6 +67,22 @@ def _supported_color_modes(device_type: str) -> set[ColorMode]:
     return modes
 
 
+def _common_color_modes(device_types: list[str]) -> set[ColorMode]:
+    """Return the color modes every device of a group supports."""
+    modes = [_supported_color_modes(device_type) for device_type in device_types]
+    if not modes:
+        return {ColorMode.ONOFF}
+
+    common = set.intersection(*modes)
+    if common:
+        return common
+
+    # No shared color mode, e.g. RGB and white only lights: all still dim
+    if all(mode != {ColorMode.ONOFF} for mode in modes):
+        return {ColorMode.BRIGHTNESS}
+    return {ColorMode.ONOFF}
+
+
 def _default_color_mode(supported_color_modes: set[ColorMode]) -> ColorMode:
     """Return a valid initial color mode for the light."""
     for color_mode in (
@@ -51,6 +97,42 @@ def _default_color_mode(supported_color_modes: set[ColorMode]) -> ColorMode:
     return next(iter(supported_color_modes))
 
 
+def _status_brightness(status: dict) -> int:
+    """Return the Home Assistant brightness of a mesh status report."""
+    if status["color_mode"]:
+        # Color brightness goes from 0x0a to 0x64
+        return round(max(status["color_brightness"] - 0x0A, 0) * 255 / (0x64 - 0x0A))
+
+    # White brightness goes from 0x01 to 0x7f
+    return round(max(status["white_brightness"] - 1, 0) * 255 / (0x7F - 1))
+
+
+def _color_brightness(brightness: int) -> int:
+    """Return the mesh color brightness for a Home Assistant brightness."""
+    return 0x0A + round(brightness * (0x64 - 0x0A) / 255)
+
+
+def _white_brightness(brightness: int) -> int:
+    """Return the mesh white brightness for a Home Assistant brightness."""
+    return 0x01 + round(brightness * (0x7F - 1) / 255)
+
+
+def _white_temperature(kelvin: int) -> int:
+    """Return the mesh white temperature, 0 warm to 0x7f cold, for a kelvin value."""
+    kelvin = min(max(kelvin, MIN_COLOR_TEMP_KELVIN), MAX_COLOR_TEMP_KELVIN)
+    return round(
+        (kelvin - MIN_COLOR_TEMP_KELVIN) * 0x7F / (MAX_COLOR_TEMP_KELVIN - MIN_COLOR_TEMP_KELVIN)
+    )
+
+
+def _status_color_temp(status: dict) -> int:
+    """Return the kelvin value of a mesh status report."""
+    return round(
+        MIN_COLOR_TEMP_KELVIN
+        + status["white_temp"] * (MAX_COLOR_TEMP_KELVIN - MIN_COLOR_TEMP_KELVIN) / 0x7F
+    )
+
+
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities
 ) -> None:
@@ -60,46 +142,84 @@ async def async_setup_entry(
     mesh = hass.data[DOMAIN][entry.entry_id]
     _LOGGER.info("mesh %s", mesh)
 
-    lights: list[AwoxLight] = []
-    for device in entry.data[CONF_DEVICES]:
-        device_type = device.get("type", "")
-
-        # Skip non lights.
-        if "light" not in device_type:
-            continue
-
-        supported_color_modes = _supported_color_modes(device_type)
-
-        mac = device[CONF_MAC].upper()
-        _LOGGER.info("mac %s", mac)
-
-        ble_device = bluetooth.async_ble_device_from_address(
-            hass, mac, connectable=True
-        )
-        _LOGGER.info("ble_device %s", ble_device)
-
-        light = AwoxLight(
-            mesh,
-            device[CONF_MAC],
-            device[CONF_MESH_ID],
-            device[CONF_NAME],
-            supported_color_modes,
-            device.get(CONF_MANUFACTURER),
-            device.get(CONF_MODEL),
-            device.get(CONF_FIRMWARE),
-            ble_device,
-        )
-
-        _LOGGER.info(" :: Setup light [%d] %s", device[CONF_MESH_ID], device[CONF_NAME])
-        lights.append(light)
-
-    async_add_entities(lights)
+    known_mesh_ids: set[int] = set()
+
+    @callback
+    def async_add_new_lights(devices: list[dict]) -> None:
+        """Add entities for the lights not seen yet."""
+        lights: list[AwoxLight] = []
+        for device in devices:
+            device_type = device.get("type", "")
+
+            # Skip non lights.
+            if "light" not in device_type:
+                continue
+
+            if device[CONF_MESH_ID] in known_mesh_ids:
+                continue
+            known_mesh_ids.add(device[CONF_MESH_ID])
+
+            light = AwoxLight(
+                mesh,
+                device[CONF_MAC],
+                device[CONF_MESH_ID],
+                device[CONF_NAME],
+                _supported_color_modes(device_type),
+                device.get(CONF_MANUFACTURER),
+                device.get(CONF_MODEL),
+                device.get(CONF_FIRMWARE),
+            )
+
+            _LOGGER.info(" :: Setup light [%d] %s", device[CONF_MESH_ID], device[CONF_NAME])
+            lights.append(light)
+
+        if lights:
+            async_add_entities(lights)
+
+    async_add_new_lights(entry.data[CONF_DEVICES])
+
+    # Lights added later in the AwoX app show up without a reload
+    entry.async_on_unload(mesh.async_subscribe_devices(async_add_new_lights))
+
+    group_lights: dict[str, AwoxGroupLight] = {}
+
+    @callback
+    def async_add_new_groups(groups: list[dict]) -> None:
+        """Add a light per room, and follow the membership of known ones."""
+        types = {device[CONF_MESH_ID]: device.get("type", "") for device in mesh.devices}
+        lights: list[AwoxGroupLight] = []
+
+        for group in groups:
+            light = group_lights.get(group["room_id"])
+            if light is not None:
+                light.async_update_members()
+                continue
+            if not group["members"]:
+                continue
+
+            light = AwoxGroupLight(
+                mesh,
+                entry.entry_id,
+                group,
+                _common_color_modes([types.get(mesh_id, "") for mesh_id in group["members"]]),
+            )
+            _LOGGER.info(" :: Setup room [%#06x] %s", group["address"], group["name"])
+            group_lights[group["room_id"]] = light
+            lights.append(light)
+
+        if lights:
+            async_add_entities(lights)
+
+    async_add_new_groups(mesh.group_entries)
+    entry.async_on_unload(mesh.async_subscribe_groups(async_add_new_groups))
 
 
 class AwoxLight(LightEntity):
     """Representation of an AwoX light."""
 
     _attr_should_poll = False
+    _attr_min_color_temp_kelvin = MIN_COLOR_TEMP_KELVIN
+    _attr_max_color_temp_kelvin = MAX_COLOR_TEMP_KELVIN
 
     def __init__(
         self,
@@ -111,13 +231,11 @@ class AwoxLight(LightEntity):
         manufacturer: str | None,
         model: str | None,
         firmware: str | None,
-        ble_device,
     ) -> None:
         """Initialize an AwoX MESH light."""
         self._mesh = coordinator
         self._mac = mac
         self._mesh_id = mesh_id
-        self._ble = ble_device
 
         self._attr_name = name
         self._attr_unique_id = f"awoxmesh-{mac.lower()}-{mesh_id}"
@@ -126,6 +244,11 @@ class AwoxLight(LightEntity):
 
         if supported_color_modes != {ColorMode.ONOFF}:
             self._attr_brightness = 255
+            self._attr_supported_features = LightEntityFeature.TRANSITION | LightEntityFeature.EFFECT
+            self._attr_effect_list = [EFFECT_BREATHE]
+            if ColorMode.RGB in supported_color_modes:
+                self._attr_effect_list.append(EFFECT_COLORLOOP)
+                self._attr_effect_list.extend(PRESET_EFFECTS)
 
         self._manufacturer = manufacturer
         self._model = model
@@ -133,30 +256,228 @@ class AwoxLight(LightEntity):
 
         self._state: bool | None = None
 
+        # Brightness to come back to after a faded turn off, which leaves
+        # the light at its lowest level
+        self._restore_brightness: int | None = None
+
     @property
     def is_on(self) -> bool | None:
         """Return true if light is on."""
         return self._state
 
+    @property
+    def available(self) -> bool:
+        """Return true if the mesh heard from this light recently."""
+        return self._mesh.is_available(self._mesh_id)
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the status reports and presence of this light."""
+        self.async_on_remove(
+            self._mesh.async_subscribe_status(self._mesh_id, self._handle_status)
+        )
+        self.async_on_remove(
+            self._mesh.async_subscribe_presence(self._mesh_id, self.async_write_ha_state)
+        )
+
+        status = self._mesh.statuses.get(self._mesh_id)
+        if status is not None:
+            self._apply_status(status)
+
+    @callback
+    def _handle_status(self, status: dict) -> None:
+        """Update the entity from a status pushed by the mesh."""
+        if (
+            self._attr_effect is not None
+            and self._attr_effect not in PRESET_EFFECTS
+            and not self._mesh.effects.is_playing(self._mesh_id)
+        ):
+            # Stopped by a command to a group or the whole mesh
+            self._attr_effect = None
+        self._apply_status(status)
+        self.async_write_ha_state()
+
+    def _apply_status(self, status: dict) -> None:
+        """Copy a mesh status report into the entity attributes."""
+        self._state = status["state"]
+
+        if self._attr_supported_color_modes == {ColorMode.ONOFF}:
+            return
+
+        self._attr_brightness = _status_brightness(status)
+
+        if status["color_mode"] and ColorMode.RGB in self._attr_supported_color_modes:
+            self._attr_color_mode = ColorMode.RGB
+            self._attr_rgb_color = (status["red"], status["green"], status["blue"])
+        elif not status["color_mode"] and ColorMode.COLOR_TEMP in self._attr_supported_color_modes:
+            self._attr_color_mode = ColorMode.COLOR_TEMP
+            self._attr_color_temp_kelvin = _status_color_temp(status)
+
+    def _turn_on_commands(self, kwargs: dict[str, Any]) -> list[tuple[int, bytes]]:
+        """Return the (command, data) pairs needed for a turn on request.
+
+        One packet per changed attribute. Setting a color or a white value
+        lights the bulb, so power on is only sent when nothing else is or
+        the light is not known to be on.
+        """
+        commands = []
+        color_mode = self._attr_color_mode
+
+        if ATTR_RGB_COLOR in kwargs and ColorMode.RGB in self._attr_supported_color_modes:
+            color_mode = ColorMode.RGB
+            commands.append(encode_color(*kwargs[ATTR_RGB_COLOR]))
+
+        if (
+            ATTR_COLOR_TEMP_KELVIN in kwargs
+            and ColorMode.COLOR_TEMP in self._attr_supported_color_modes
+        ):
+            color_mode = ColorMode.COLOR_TEMP
+            commands.append(
+                encode_white_temperature(_white_temperature(kwargs[ATTR_COLOR_TEMP_KELVIN]))
+            )
+
+        if ATTR_BRIGHTNESS in kwargs and self._attr_supported_color_modes != {ColorMode.ONOFF}:
+            if color_mode == ColorMode.RGB:
+                commands.append(encode_color_brightness(_color_brightness(kwargs[ATTR_BRIGHTNESS])))
+            else:
+                commands.append(encode_white_brightness(_white_brightness(kwargs[ATTR_BRIGHTNESS])))
+
+        if not commands or self._state is not True:
+            commands.insert(0, encode_power(True))
+
+        return commands
+
+    def _transition_channels(
+        self, kwargs: dict[str, Any]
+    ) -> dict[int, tuple[tuple[int, ...], tuple[int, ...]]]:
+        """Return the (start, end) mesh values to fade through for a turn on request."""
+        channels = {}
+        color_mode = self._attr_color_mode
+        if ATTR_RGB_COLOR in kwargs and ColorMode.RGB in self._attr_supported_color_modes:
+            color_mode = ColorMode.RGB
+        elif (
+            ATTR_COLOR_TEMP_KELVIN in kwargs
+            and ColorMode.COLOR_TEMP in self._attr_supported_color_modes
+        ):
+            color_mode = ColorMode.COLOR_TEMP
+
+        # A light that is off fades in from its lowest level
+        start = self._attr_brightness if self._state else 0
+        end = kwargs.get(ATTR_BRIGHTNESS, self._attr_brightness or 255)
+
+        # Colors only fade within the same mode, a mode change jumps
+        same_mode = color_mode == self._attr_color_mode and self._state
+
+        if color_mode == ColorMode.RGB:
+            channels[C_COLOR_BRIGHTNESS] = ((_color_brightness(start),), (_color_brightness(end),))
+            if ATTR_RGB_COLOR in kwargs:
+                target = tuple(kwargs[ATTR_RGB_COLOR])
+                current = self._attr_rgb_color if same_mode and self._attr_rgb_color else target
+                channels[C_COLOR] = (tuple(current), target)
+        else:
+            channels[C_WHITE_BRIGHTNESS] = ((_white_brightness(start),), (_white_brightness(end),))
+            if ATTR_COLOR_TEMP_KELVIN in kwargs and color_mode == ColorMode.COLOR_TEMP:
+                target = _white_temperature(kwargs[ATTR_COLOR_TEMP_KELVIN])
+                current = (
+                    _white_temperature(self._attr_color_temp_kelvin)
+                    if same_mode and self._attr_color_temp_kelvin
+                    else target
+                )
+                channels[C_WHITE_TEMPERATURE] = ((current,), (target,))
+
+        return channels
+
+    def _apply_turn_on(self, kwargs: dict[str, Any]) -> None:
+        """Copy a successful turn on request into the entity attributes."""
+        self._state = True
+        if ATTR_BRIGHTNESS in kwargs:
+            self._attr_brightness = kwargs[ATTR_BRIGHTNESS]
+        if ATTR_RGB_COLOR in kwargs and ColorMode.RGB in self._attr_supported_color_modes:
+            self._attr_color_mode = ColorMode.RGB
+            self._attr_rgb_color = kwargs[ATTR_RGB_COLOR]
+        if (
+            ATTR_COLOR_TEMP_KELVIN in kwargs
+            and ColorMode.COLOR_TEMP in self._attr_supported_color_modes
+        ):
+            self._attr_color_mode = ColorMode.COLOR_TEMP
+            self._attr_color_temp_kelvin = kwargs[ATTR_COLOR_TEMP_KELVIN]
+
+    async def _async_start_effect(self, effect: str) -> None:
+        """Power the light on if needed and play an effect on it.
+
+        Presets are played by the light itself, the other effects by the
+        hub's effect engine.
+        """
+        preset = None
+        if effect in PRESET_EFFECTS and ColorMode.RGB in self._attr_supported_color_modes:
+            preset = PRESET_EFFECTS[effect]
+        elif effect == EFFECT_COLORLOOP and ColorMode.RGB in self._attr_supported_color_modes:
+            frame = colorloop_frame
+        elif effect == EFFECT_BREATHE:
+            brightness = self._attr_brightness or 255
+            if self._attr_color_mode == ColorMode.RGB:
+                frame = breathe_frame(C_COLOR_BRIGHTNESS, 0x0A, _color_brightness(brightness))
+            else:
+                frame = breathe_frame(C_WHITE_BRIGHTNESS, 0x01, _white_brightness(brightness))
+        else:
+            _LOGGER.warning("Unsupported effect %s for %s", effect, self.entity_id)
+            return
+
+        if self._state is not True and not await self._mesh.async_send_command(
+            *encode_power(True), self._mesh_id
+        ):
+            return
+
+        if preset is not None:
+            if not await self._mesh.async_send_command(*encode_preset(preset), self._mesh_id):
+                return
+        else:
+            self._mesh.effects.start_effect(self._mesh_id, frame)
+        self._state = True
+        self._attr_effect = effect
+        if effect == EFFECT_COLORLOOP or preset is not None:
+            self._attr_color_mode = ColorMode.RGB
+        self.async_write_ha_state()
+
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Instruct the light to turn on."""
-        if self._ble is None:
-            _LOGGER.info("No light detected")
+        effect = kwargs.pop(ATTR_EFFECT, None)
+        if effect is not None and effect != EFFECT_OFF:
+            await self._async_start_effect(effect)
             return
 
-        _LOGGER.info("Turn on...%s", self._ble)
-        resp = await AwoxMeshLight.connect_to_device(
-            self._ble,
-            b"\x01",
-            self._mesh._mesh_name,
-            self._mesh.mesh_password,
+        # Any other request stops the effect, through the command it sends
+        self._attr_effect = None
+
+        if self._restore_brightness is not None and ATTR_BRIGHTNESS not in kwargs:
+            kwargs[ATTR_BRIGHTNESS] = self._restore_brightness
+        self._restore_brightness = None
+
+        transition = kwargs.get(ATTR_TRANSITION)
+        if transition and self._attr_supported_color_modes != {ColorMode.ONOFF}:
+            channels = self._transition_channels(kwargs)
+            # Powered on once set to the starting level, so it does not flash
+            initial = [encode_power(True)] if self._state is not True else []
+
+            _LOGGER.info("Fade on...%s over %s s", self._mesh_id, transition)
+            self._mesh.effects.start_transition(self._mesh_id, channels, transition, initial)
+            self._apply_turn_on(kwargs)
+            self.async_write_ha_state()
+            return
+
+        commands = self._turn_on_commands(kwargs)
+
+        _LOGGER.info("Turn on...%s %s", self._mesh_id, commands)
+        results = await asyncio.gather(
+            *(
+                self._mesh.async_send_command(command, data, self._mesh_id)
+                for command, data in commands
+            )
         )
+        resp = all(results)
         _LOGGER.info("Turned on...%s ", resp)
 
         if resp is True:
-            self._state = True
-            if ATTR_BRIGHTNESS in kwargs:
-                self._attr_brightness = kwargs[ATTR_BRIGHTNESS]
+            self._apply_turn_on(kwargs)
             self.async_write_ha_state()
             _LOGGER.info("Turned on...%s ", self._state)
             
@@ -167,20 +488,105 @@ class AwoxLight(LightEntity):
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Instruct the light to turn off."""
-        if self._ble is None:
-            _LOGGER.info("No light detected")
+        self._attr_effect = None
+
+        transition = kwargs.get(ATTR_TRANSITION)
+        if transition and self._state and self._attr_supported_color_modes != {ColorMode.ONOFF}:
+            if self._attr_color_mode == ColorMode.RGB:
+                channels = {
+                    C_COLOR_BRIGHTNESS: ((_color_brightness(self._attr_brightness or 255),), (0x0A,))
+                }
+            else:
+                channels = {
+                    C_WHITE_BRIGHTNESS: ((_white_brightness(self._attr_brightness or 255),), (0x01,))
+                }
+
+            _LOGGER.info("Fade off...%s over %s s", self._mesh_id, transition)
+            self._mesh.effects.start_transition(
+                self._mesh_id, channels, transition, final=[encode_power(False)]
+            )
+            self._restore_brightness = self._attr_brightness
+            self._state = False
+            self.async_write_ha_state()
             return
 
-        _LOGGER.info("Turn off...%s ", self._ble)
-        resp = await AwoxMeshLight.connect_to_device(
-            self._ble,
-            b"\x00",
-            self._mesh._mesh_name,
-            self._mesh.mesh_password,
-        )
+        _LOGGER.info("Turn off...%s ", self._mesh_id)
+        resp = await self._mesh.async_send_command(*encode_power(False), self._mesh_id)
         _LOGGER.info("Turned off...%s ", resp)
 
         if resp is True:
             self._state = False
             self.async_write_ha_state()
-            _LOGGER.info("Turned off...%s ", self._state)
\ No newline at end of file
+            _LOGGER.info("Turned off...%s ", self._state)
+
+
+class AwoxGroupLight(AwoxLight):
+    """A room of the AwoX app, driven through its mesh group address.
+
+    One packet reaches every light of the room. The state follows the
+    status reports of the members: on when any of them is on, available
+    while any of them is heard.
+    """
+
+    def __init__(
+        self,
+        coordinator: AwoxMeshLight,
+        entry_id: str,
+        group: dict,
+        supported_color_modes: set[ColorMode],
+    ) -> None:
+        """Initialize the light of a room."""
+        super().__init__(
+            coordinator, "", group["address"], group["name"], supported_color_modes, None, None, None
+        )
+        self._attr_unique_id = f"awoxmesh-{entry_id}-room-{group['room_id']}"
+        self._attr_icon = "mdi:lightbulb-group"
+
+        self._members: set[int] = set()
+        self._member_unsubscribes: list = []
+
+    @property
+    def available(self) -> bool:
+        """Return true if the mesh heard from a light of the room recently."""
+        return any(self._mesh.is_available(mesh_id) for mesh_id in self._members)
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the status reports and presence of the room's lights."""
+        self.async_update_members()
+        self.async_on_remove(self._unsubscribe_members)
+
+    @callback
+    def async_update_members(self) -> None:
+        """Follow the lights provisioned in the group."""
+        members = self._mesh.group_members(self._mesh_id)
+        if members == self._members and self._member_unsubscribes:
+            return
+
+        self._unsubscribe_members()
+        self._members = members
+        for mesh_id in members:
+            self._member_unsubscribes.append(
+                self._mesh.async_subscribe_status(mesh_id, self._handle_status)
+            )
+            self._member_unsubscribes.append(
+                self._mesh.async_subscribe_presence(mesh_id, self.async_write_ha_state)
+            )
+
+        statuses = [self._mesh.statuses[m] for m in members if m in self._mesh.statuses]
+        if statuses:
+            self._apply_status(statuses[-1])
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    def _unsubscribe_members(self) -> None:
+        while self._member_unsubscribes:
+            self._member_unsubscribes.pop()()
+
+    def _apply_status(self, status: dict) -> None:
+        """Take the levels of the last member heard, on when any member is."""
+        super()._apply_status(status)
+        self._state = any(
+            self._mesh.statuses[mesh_id]["state"]
+            for mesh_id in self._members
+            if mesh_id in self._mesh.statuses
+        )
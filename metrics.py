@@ -0,0 +1,115 @@
+"""Counters and timing histograms of the mesh hot path."""
+from __future__ import annotations
+
+import math
+import time
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+
+
+class Histogram:
+    """Fixed bucket histogram of durations."""
+
+    __slots__ = ("counts", "count", "total", "minimum", "maximum")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def observe(self, milliseconds: float) -> None:
+        for index, bound in enumerate(BUCKETS_MS):
+            if milliseconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += milliseconds
+        self.minimum = min(self.minimum, milliseconds)
+        self.maximum = max(self.maximum, milliseconds)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.mean,
+            "min_ms": self.minimum if self.count else None,
+            "max_ms": self.maximum if self.count else None,
+            "buckets_ms": {
+                ("inf" if bound == math.inf else str(bound)): count
+                for bound, count in zip(BUCKETS_MS, self.counts)
+            },
+        }
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> _Timer:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe((time.perf_counter() - self._start) * 1000)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> _NullTimer:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class AwoxMetrics:
+    """Hub metrics. While disabled every call returns at once."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def maximum(self, name: str, value: int) -> None:
+        """Keep the largest value seen under name."""
+        if not self.enabled:
+            return
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    def timer(self, name: str):
+        """Return a context manager timing its block into histogram name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return _Timer(histogram)
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "counters": dict(self.counters),
+            "timings": {name: histogram.as_dict() for name, histogram in self.histograms.items()},
+        }
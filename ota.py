@@ -0,0 +1,235 @@
+"""Over-the-air firmware updates of AwoX mesh nodes."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+from homeassistant.components import persistent_notification
+from homeassistant.const import CONF_DEVICES
+from homeassistant.core import HomeAssistant
+
+from .awox import AwoxMeshLight
+from .connection_budget import PRIORITY_OTA, adapter_of
+from .const import CONF_FIRMWARE, DATA_CONNECTION_BUDGET, DOMAIN
+from .protocol import OTA_CHAR_UUID, OTA_CHUNK_SIZE, make_ota_end_packet, make_ota_packet
+
+_LOGGER = logging.getLogger(__name__)
+
+FIRMWARE_DIR = "awox_firmware"
+
+EVENT_OTA_PROGRESS = f"{DOMAIN}_ota_progress"
+
+# Nodes updated at the same time, each one holds a BLE connection
+DEFAULT_OTA_CONNECTIONS = 2
+
+# OTA packets written before waiting for the node with a read
+OTA_FLOW_BLOCK = 8
+
+# Seconds an update waits for a connection slot, the hubs may hold them all
+OTA_SLOT_TIMEOUT = 60
+
+
+def parse_version(version: str | None) -> tuple[int, ...]:
+    """Return a comparable form of a firmware version like 2.2.6."""
+    parts = []
+    for part in (version or "").split("."):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+
+class AwoxFirmwareUpdater:
+    """Compare node firmware with local images and flash the newer ones.
+
+    Images live in <config>/awox_firmware/<model>/<version>.bin. Nodes are
+    flashed over their own BLE connection, several at once within the
+    connection budget. Each connection also takes a slot of the budget
+    shared with the hubs, at the lowest priority.
+    """
+
+    def __init__(self, hass: HomeAssistant, connections: int = DEFAULT_OTA_CONNECTIONS) -> None:
+        self._hass = hass
+        self._firmware_dir = hass.config.path(FIRMWARE_DIR)
+        self._budget = asyncio.Semaphore(connections)
+
+    def _latest_images(self) -> dict[str, tuple[tuple[int, ...], str]]:
+        """Return model -> (version, path) of the newest local image. Runs in the executor."""
+        images = {}
+        if not os.path.isdir(self._firmware_dir):
+            return images
+
+        for model in os.listdir(self._firmware_dir):
+            model_dir = os.path.join(self._firmware_dir, model)
+            if not os.path.isdir(model_dir):
+                continue
+            for name in os.listdir(model_dir):
+                if not name.endswith(".bin"):
+                    continue
+                version = parse_version(name[:-4])
+                if version and (model not in images or version > images[model][0]):
+                    images[model] = (version, os.path.join(model_dir, name))
+
+        return images
+
+    async def async_check(self, meshes: list[AwoxMeshLight]) -> list[tuple[AwoxMeshLight, dict, str]]:
+        """Return (hub, device, image path) for each node with a newer image."""
+        images = await self._hass.async_add_executor_job(self._latest_images)
+
+        updates = []
+        for mesh in meshes:
+            for device in mesh.devices:
+                image = images.get(device.get("model"))
+                if image is None or image[0] <= parse_version(device.get("firmware")):
+                    continue
+                updates.append((mesh, device, image[1]))
+
+        return updates
+
+    async def async_check_all(self, meshes: list[AwoxMeshLight]) -> None:
+        """Report the nodes that have an update available."""
+        updates = await self.async_check(meshes)
+
+        if not updates:
+            message = "All AwoX devices are up to date."
+        else:
+            message = "\n".join(
+                f"- {device['name']} ({device['mesh_id']}): {device.get('firmware')} -> "
+                f"{os.path.basename(path)[:-4]}"
+                for _, device, path in updates
+            )
+
+        persistent_notification.async_create(
+            self._hass, message, "AwoX firmware", f"{DOMAIN}_ota_check"
+        )
+
+    async def async_update_all(self, meshes: list[AwoxMeshLight], connections: int | None = None) -> None:
+        """Flash every node that has a newer image, in parallel.
+
+        connections overrides the default budget of simultaneous updates.
+        """
+        updates = await self.async_check(meshes)
+        budget = asyncio.Semaphore(connections) if connections else None
+
+        await asyncio.gather(
+            *(self.async_install(mesh, device, path, budget) for mesh, device, path in updates)
+        )
+
+    async def async_install(
+        self,
+        mesh: AwoxMeshLight,
+        device: dict,
+        path: str | None = None,
+        budget: asyncio.Semaphore | None = None,
+    ) -> bool:
+        """Flash one node, with the newest local image for its model by default."""
+        if path is None:
+            images = await self._hass.async_add_executor_job(self._latest_images)
+            image = images.get(device.get("model"))
+            if image is None:
+                _LOGGER.info("No firmware image for model %s", device.get("model"))
+                return False
+            path = image[1]
+
+        firmware = await self._hass.async_add_executor_job(_read_file, path)
+
+        async with budget or self._budget:
+            if not await self._async_flash(mesh, device, firmware):
+                return False
+
+        self._record_firmware(mesh, device["mesh_id"], os.path.basename(path)[:-4])
+        return True
+
+    def _record_firmware(self, mesh: AwoxMeshLight, mesh_id: int, version: str) -> None:
+        """Save the flashed version in the entry, so the node is not flashed again."""
+        for entry in self._hass.config_entries.async_entries(DOMAIN):
+            if self._hass.data[DOMAIN].get(entry.entry_id) is not mesh:
+                continue
+
+            devices = [
+                {**device, CONF_FIRMWARE: version} if device["mesh_id"] == mesh_id else device
+                for device in entry.data.get(CONF_DEVICES, [])
+            ]
+            self._hass.config_entries.async_update_entry(
+                entry, data={**entry.data, CONF_DEVICES: devices}
+            )
+            mesh.async_update_devices(devices)
+            return
+
+    async def _async_flash(self, mesh: AwoxMeshLight, device: dict, firmware: bytes) -> bool:
+        from bleak import BleakClient
+        from bleak_retry_connector import establish_connection
+
+        mesh_id = device["mesh_id"]
+        node = mesh.node(mesh_id)
+        if node is None or node.ble_device is None:
+            _LOGGER.info("OTA: %s is not advertising", device["name"])
+            return False
+
+        # The node only takes one connection, keep the session off it
+        await mesh.async_release_node(node.mac)
+
+        slot = None
+        client = None
+        try:
+            budget = self._hass.data[DOMAIN].get(DATA_CONNECTION_BUDGET)
+            if budget is not None:
+                try:
+                    async with asyncio.timeout(OTA_SLOT_TIMEOUT):
+                        slot = await budget.async_acquire(adapter_of(node.ble_device), PRIORITY_OTA)
+                except TimeoutError:
+                    raise TimeoutError(f"no connection slot within {OTA_SLOT_TIMEOUT} s") from None
+
+            client = await establish_connection(
+                BleakClient, node.ble_device, node.mac, max_attempts=2, timeout=15
+            )
+
+            if await AwoxMeshLight.async_pair(client, mesh._mesh_name, mesh.mesh_password) is None:
+                return False
+
+            total = (len(firmware) + OTA_CHUNK_SIZE - 1) // OTA_CHUNK_SIZE
+            last_percent = -1
+
+            for index in range(total):
+                chunk = firmware[index * OTA_CHUNK_SIZE:(index + 1) * OTA_CHUNK_SIZE]
+                await client.write_gatt_char(
+                    OTA_CHAR_UUID, make_ota_packet(index, chunk), response=False
+                )
+
+                # Let the node catch up before the next block
+                if index % OTA_FLOW_BLOCK == OTA_FLOW_BLOCK - 1:
+                    await client.read_gatt_char(OTA_CHAR_UUID)
+
+                percent = (index + 1) * 100 // total
+                if percent != last_percent and percent % 5 == 0:
+                    last_percent = percent
+                    self._hass.bus.async_fire(
+                        EVENT_OTA_PROGRESS, {"mesh_id": mesh_id, "progress": percent}
+                    )
+                    _LOGGER.info("OTA %s: %d%%", device["name"], percent)
+
+            await client.write_gatt_char(
+                OTA_CHAR_UUID, make_ota_end_packet(total - 1), response=False
+            )
+            _LOGGER.info("OTA %s: done, node reboots", device["name"])
+            return True
+
+        except Exception as e:
+            _LOGGER.info("OTA %s failed: %s", device["name"], e)
+            self._hass.bus.async_fire(
+                EVENT_OTA_PROGRESS, {"mesh_id": mesh_id, "progress": None, "error": str(e)}
+            )
+            return False
+
+        finally:
+            if client and client.is_connected:
+                await client.disconnect()
+            if slot is not None:
+                slot.release()
+            mesh.restore_node(node.mac)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
@@ -0,0 +1,492 @@
+"""Telink mesh protocol of AwoX lights: packets, crypto and status parsing.
+
+Pure Python, without Home Assistant or transport imports, so it can be
+used and benchmarked on its own. pycryptodome is imported on first use.
+"""
+from __future__ import annotations
+
+import struct
+from os import urandom
+
+PAIR_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1914'
+COMMAND_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1912'
+STATUS_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1911'
+OTA_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1913'
+SERV_CHAR_UUID = '00010203-0405-0607-0809-0a0b0c0d1913'
+
+C_POWER = 0xd0
+C_LIGHT_MODE = 0x33
+C_PRESET = 0xc8
+C_WHITE_BRIGHTNESS = 0xf1
+C_WHITE_TEMPERATURE = 0xf0
+C_COLOR_BRIGHTNESS = 0xf2
+C_COLOR = 0xe2
+C_SEQUENCE_COLOR_DURATION = 0xf5
+C_SEQUENCE_FADE_DURATION = 0xf6
+C_GET_STATUS_SENT = 0xda
+C_GET_STATUS_RECEIVED = 0xdb
+C_NOTIFICATION_RECEIVED = 0xdc
+C_GROUP_EDIT = 0xd7
+C_SCENE_EDIT = 0xee
+C_SCENE_LOAD = 0xef
+
+# Built-in color sequences of the firmware, numbered from 0
+PRESET_COUNT = 7
+
+# Destination that every node in the mesh accepts
+BROADCAST_MESH_ID = 0xFFFF
+
+# Group addresses have the high bit set, the AwoX app does not use them
+GROUP_ADDRESS_FLAG = 0x8000
+
+# Commands a light answers with a status notification, which confirms
+# their delivery when packets are written without response
+ACKED_COMMANDS = frozenset({
+    C_POWER,
+    C_LIGHT_MODE,
+    C_PRESET,
+    C_WHITE_BRIGHTNESS,
+    C_WHITE_TEMPERATURE,
+    C_COLOR_BRIGHTNESS,
+    C_COLOR,
+})
+
+# Commands the AwoX/EGLO remotes send to the lights, with the event
+# each one stands for when relayed to the hub
+REMOTE_EVENTS = {
+    C_POWER: 'power',
+    C_WHITE_BRIGHTNESS: 'brightness',
+    C_COLOR_BRIGHTNESS: 'brightness',
+    C_WHITE_TEMPERATURE: 'white_temperature',
+    C_COLOR: 'color',
+    C_PRESET: 'preset',
+    C_SCENE_LOAD: 'scene',
+}
+REMOTE_EVENT_TYPES = ['on', 'off', 'brightness', 'white_temperature', 'color', 'preset', 'scene']
+
+# Commands editing a node's own group and scene tables. They are always
+# written with response to each node address: a node that missed its group
+# join would not hear a group address, and the broadcast address also
+# reaches remotes and nodes that are not configured
+NODE_EDIT_COMMANDS = frozenset({C_GROUP_EDIT, C_SCENE_EDIT})
+
+# Firmware bytes per OTA packet, and the index that ends an update
+OTA_CHUNK_SIZE = 16
+OTA_END = 0xFF02
+
+_ZERO_BLOCK = memoryview(bytes(16))
+
+_AES = None
+
+
+def _new_cipher(key: bytes):
+    """Return an AES-ECB cipher for key."""
+    global _AES
+    if _AES is None:
+        from Crypto.Cipher import AES
+        _AES = AES
+    return _AES.new(key, _AES.MODE_ECB)
+
+
+def xor_bytes (a, b):
+    """XOR two byte strings as whole integers, truncated to the shorter one."""
+    n = min (len(a), len(b))
+    x = int.from_bytes (a[:n], 'little') ^ int.from_bytes (b[:n], 'little')
+    return bytearray (x.to_bytes (n, 'little'))
+
+
+def _clamp (value, low, high):
+    return max (low, min (high, int (value)))
+
+
+def encode_power (on):
+    """Return (command, data) switching a light on or off."""
+    return C_POWER, b'\x01' if on else b'\x00'
+
+
+def encode_color (red, green, blue):
+    """Return (command, data) setting the RGB color, each channel 0-255."""
+    return C_COLOR, bytes ([0x04, _clamp (red, 0, 0xff), _clamp (green, 0, 0xff), _clamp (blue, 0, 0xff)])
+
+
+def encode_color_brightness (brightness):
+    """Return (command, data) setting the color brightness, 0x0a-0x64."""
+    return C_COLOR_BRIGHTNESS, bytes ([_clamp (brightness, 0x0a, 0x64)])
+
+
+def encode_white_brightness (brightness):
+    """Return (command, data) setting the white brightness, 0x01-0x7f."""
+    return C_WHITE_BRIGHTNESS, bytes ([_clamp (brightness, 0x01, 0x7f)])
+
+
+def encode_white_temperature (temperature):
+    """Return (command, data) setting the white temperature, 0x00 (warm) - 0x7f (cold)."""
+    return C_WHITE_TEMPERATURE, bytes ([_clamp (temperature, 0x00, 0x7f)])
+
+
+def encode_preset (preset):
+    """Return (command, data) starting one of the built-in color presets, 0 to PRESET_COUNT - 1."""
+    return C_PRESET, bytes ([_clamp (preset, 0x00, PRESET_COUNT - 1)])
+
+
+def encode_group_edit (group_address, add):
+    """Return (command, data) adding a node to a mesh group, or removing it."""
+    return C_GROUP_EDIT, (b'\x01' if add else b'\x00') + struct.pack ('<H', group_address)
+
+
+def encode_scene_store (scene_id, on, color_mode, white_brightness, white_temp, color_brightness, red, green, blue):
+    """Return (command, data) saving light settings in one of the node's scene slots."""
+    flags = (0x01 if on else 0x00) | (0x02 if color_mode else 0x00)
+    return C_SCENE_EDIT, bytes ([
+        0x01,
+        _clamp (scene_id, 0x01, 0xff),
+        flags,
+        _clamp (white_brightness, 0x01, 0x7f),
+        _clamp (white_temp, 0x00, 0x7f),
+        _clamp (color_brightness, 0x0a, 0x64),
+        _clamp (red, 0, 0xff),
+        _clamp (green, 0, 0xff),
+        _clamp (blue, 0, 0xff),
+    ])
+
+
+def encode_scene_delete (scene_id):
+    """Return (command, data) clearing one of the node's scene slots."""
+    return C_SCENE_EDIT, bytes ([0x00, _clamp (scene_id, 0x01, 0xff)])
+
+
+def encode_scene_recall (scene_id):
+    """Return (command, data) applying the settings saved in a scene slot."""
+    return C_SCENE_LOAD, bytes ([_clamp (scene_id, 0x01, 0xff)])
+
+
+def parse_status_packet (data):
+    """Decode a decrypted status packet.
+
+    Returns a dict with the node's mesh id and light state, or None when
+    the packet is not a status report.
+    """
+    if len (data) < 20:
+        return None
+
+    command = data[7]
+
+    if command == C_GET_STATUS_RECEIVED:
+        mesh_id = (data[4] << 8) | data[3]
+        mode = data[10]
+        white_brightness, white_temp = data[11], data[12]
+        color_brightness, red, green, blue = data[13], data[14], data[15], data[16]
+    elif command == C_NOTIFICATION_RECEIVED:
+        mesh_id = (data[19] << 8) | data[10]
+        mode = data[12]
+        white_brightness, white_temp = data[13], data[14]
+        color_brightness, red, green, blue = data[15], data[16], data[17], data[18]
+    else:
+        return None
+
+    return {
+        'mesh_id': mesh_id,
+        'state': (mode & 1) == 1,
+        'color_mode': ((mode >> 1) & 1) == 1,
+        'transition_mode': ((mode >> 2) & 1) == 1,
+        'mode': mode,
+        'white_brightness': white_brightness,
+        'white_temp': white_temp,
+        'color_brightness': color_brightness,
+        'red': red,
+        'green': green,
+        'blue': blue,
+    }
+
+
+def status_confirms (status, command, data):
+    """Return True when a parsed status shows the effect of command with data.
+
+    Commands whose effect the status does not report, like presets, are
+    confirmed by any status of the light.
+    """
+    if command == C_POWER:
+        return status['state'] == (data[0] == 1)
+    if command == C_WHITE_BRIGHTNESS:
+        return status['white_brightness'] == data[0]
+    if command == C_WHITE_TEMPERATURE:
+        return status['white_temp'] == data[0]
+    if command == C_COLOR_BRIGHTNESS:
+        return status['color_brightness'] == data[0]
+    if command == C_COLOR:
+        return (status['red'], status['green'], status['blue']) == tuple (data[1:4])
+    return True
+
+
+def parse_remote_packet (data):
+    """Decode a decrypted command a remote sent to the lights.
+
+    Returns a dict with the remote's mesh id, the event type and its
+    value, or None when the packet is not a remote command.
+    """
+    if len (data) < 20:
+        return None
+
+    event = REMOTE_EVENTS.get (data[7])
+    if event is None:
+        return None
+
+    mesh_id = (data[4] << 8) | data[3]
+    params = data[10:20]
+
+    if event == 'power':
+        return {'mesh_id': mesh_id, 'event_type': 'on' if params[0] else 'off'}
+    if event == 'color':
+        return {'mesh_id': mesh_id, 'event_type': event, 'value': list (params[1:4])}
+    return {'mesh_id': mesh_id, 'event_type': event, 'value': params[0]}
+
+
+def encrypt (key, value):
+    assert (len(key) == 16)
+    k = bytearray (key)
+    val = bytearray(value.ljust (16, b'\x00'))
+    k.reverse ()
+    val.reverse ()
+    cipher = _new_cipher(bytes(k))
+    
+    val = bytearray(cipher.encrypt(bytes(val)))
+    val.reverse ()
+
+    return val
+
+
+def make_checksum (key, nonce, payload):
+    """
+    Args :
+        key: Encryption key, 16 bytes
+        nonce:
+        payload: The unencrypted payload.
+    """
+    base = nonce + bytearray ([len(payload)])
+    base = base.ljust (16, b'\x00')
+    check =  encrypt (key, base)
+
+    for i in range (0, len (payload), 16):
+        check_payload = bytearray (payload[i:i+16].ljust (16, b'\x00'))
+        check = xor_bytes (check, check_payload)
+        check =  encrypt (key, check)
+
+    return check
+
+
+def make_session_key (mesh_name, mesh_password, session_random, response_random):
+    random = session_random + response_random
+    m_n = bytearray (mesh_name.ljust (16, b'\x00'))
+    m_p = bytearray (mesh_password.ljust (16, b'\x00'))
+    name_pass = xor_bytes (m_n, m_p)
+    key = encrypt (name_pass, random)
+    return key
+
+def crypt_payload (key, nonce, payload):
+    """
+    Used for both encrypting and decrypting.
+
+    """
+    base = bytearray(b'\x00' + nonce)
+    base = base.ljust (16, b'\x00')
+    result = bytearray ()
+
+    for i in range (0, len (payload), 16):
+        enc_base = encrypt (key, base)
+        result += xor_bytes (enc_base, payload[i:i+16])
+        base[0] += 1
+
+    return result
+
+
+def make_command_packet (key, address, dest_id, command, data):
+    """
+    Args :
+        key: The encryption key, 16 bytes.
+        address: The mac address as a string.
+        dest_id: The mesh id of the command destination as a number.
+        command: The command as a number.
+        data: The parameters for the command as bytes.
+    """
+    # Sequence number, just need to be different, idea from https://github.com/nkaminski/csrmesh
+    s  = urandom (3)
+
+    # Build nonce
+    a = bytearray.fromhex(address.replace (":",""))
+    a.reverse()
+    nonce = bytes(a[0:4] + b'\x01' + s)
+
+    # Build payload
+    dest = struct.pack ("<H", dest_id)
+    payload = (dest + struct.pack('B', command) + b'\x60\x01' + data).ljust(15, b'\x00')
+
+    # Compute checksum
+    check = make_checksum (key, nonce, payload)
+
+    # Encrypt payload
+    payload = crypt_payload (key, nonce, payload)
+
+    # Make packet
+    packet = s + check[0:2] + payload
+    return packet
+
+def make_pair_packet (mesh_name, mesh_password, session_random):
+    m_n = bytearray (mesh_name.ljust (16, b'\x00'))
+    m_p = bytearray (mesh_password.ljust (16, b'\x00'))
+    s_r = session_random.ljust (16, b'\x00')
+    name_pass = xor_bytes (m_n, m_p)
+    enc = encrypt (s_r ,name_pass)
+    packet = bytearray(b'\x0c' + session_random) # 8bytes session_random
+    packet += enc[0:8]
+    return packet
+
+
+def crc16(data: bytes) -> int:
+    """Return the Telink OTA CRC16 (poly 0xa001, init 0xffff) of data."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def make_ota_packet(index: int, chunk: bytes) -> bytes:
+    """Return the OTA packet carrying chunk number index, padded with 0xff."""
+    body = struct.pack("<H", index) + chunk.ljust(OTA_CHUNK_SIZE, b"\xff")
+    return body + struct.pack("<H", crc16(body))
+
+
+def make_ota_end_packet(last_index: int) -> bytes:
+    """Return the packet that tells the node the image is complete."""
+    return struct.pack("<HHH", OTA_END, last_index, ~last_index & 0xFFFF)
+
+
+class AwoxSessionCrypto:
+    """Packet crypto bound to one session key.
+
+    Produces the same bytes as the module level helpers, but the
+    key is reversed once and a single AES cipher serves every block of the
+    session instead of one per block.
+
+    Command packets are built in preallocated buffers: the blocks are kept
+    byte-reversed, as the cipher wants them, so no per-block reversal or
+    padding copy is needed, and XORs are done on whole 128-bit integers.
+    """
+
+    def __init__(self, key) -> None:
+        assert (len(key) == 16)
+        self.key = bytes(key)
+        self._cipher = _new_cipher(self.key[::-1])
+        self._nonce_prefixes: dict[str, bytes] = {}
+
+        # Per session packet counter, from a random start
+        self._sequence = int.from_bytes(urandom(3), 'little')
+
+        # Reversed checksum and keystream base blocks back to back, the
+        # plain payload block and the packet being built
+        self._bases = bytearray(32)
+        self._bases[7] = 15
+        self._plain = bytearray(16)
+        self._packet = bytearray(20)
+
+    def encrypt(self, value) -> bytearray:
+        """Encrypt one block, same as encrypt with this key."""
+        block = bytes(value).ljust(16, b'\x00')
+        return bytearray(self._cipher.encrypt(block[::-1])[::-1])
+
+    def make_checksum(self, nonce, payload) -> bytearray:
+        """Same as make_checksum with this key."""
+        base = bytes(nonce) + bytes([len(payload)])
+        check = self.encrypt(base)
+
+        for i in range(0, len(payload), 16):
+            check_payload = bytes(payload[i:i+16]).ljust(16, b'\x00')
+            check = self.encrypt(xor_bytes(check, check_payload))
+
+        return check
+
+    def crypt_payload(self, nonce, payload) -> bytearray:
+        """Same as crypt_payload with this key."""
+        base = bytearray(b'\x00' + bytes(nonce)).ljust(16, b'\x00')
+        result = bytearray()
+
+        for i in range(0, len(payload), 16):
+            enc_base = self.encrypt(base)
+            result += xor_bytes(enc_base, payload[i:i+16])
+            base[0] += 1
+
+        return result
+
+    def nonce_prefix(self, address: str) -> bytes:
+        """Return the first 4 nonce bytes for a MAC address, cached."""
+        prefix = self._nonce_prefixes.get(address)
+        if prefix is None:
+            a = bytearray.fromhex(address.replace(":", ""))
+            a.reverse()
+            prefix = self._nonce_prefixes[address] = bytes(a[0:4])
+        return prefix
+
+    def decrypt_packet(self, address, packet) -> bytearray | None:
+        """Decrypt a notification, None when its checksum does not match."""
+        a = bytearray.fromhex(address.replace(":", ""))
+        a.reverse()
+        nonce = bytes(a[0:3]) + bytes(packet[0:5])
+
+        result = self.crypt_payload(nonce, packet[7:])
+        check = self.make_checksum(nonce, result)
+
+        if check[0:2] != packet[5:7]:
+            return None
+
+        return bytearray(packet[0:7]) + result
+
+    def next_sequence(self) -> bytes:
+        """Return the next 3 byte packet sequence of the session."""
+        self._sequence = (self._sequence + 1) & 0xFFFFFF
+        return self._sequence.to_bytes(3, 'little')
+
+    def make_command_packet(self, address, dest_id, command, data, sequence=None) -> bytearray:
+        """Same bytes as make_command_packet with this key.
+
+        Packets are numbered by the session counter unless a sequence is
+        given. The returned buffer is reused by the next call, write it
+        out first.
+        """
+        s = sequence if sequence is not None else self.next_sequence()
+
+        if len(data) > 10:
+            # Does not fit in one block, take the generic path
+            nonce = self.nonce_prefix(address) + b'\x01' + s
+            payload = (struct.pack("<HB", dest_id, command) + b'\x60\x01' + data).ljust(15, b'\x00')
+            check = self.make_checksum(nonce, payload)
+            return bytearray(s + check[0:2] + self.crypt_payload(nonce, payload))
+
+        # Nonce is address[0:4] + 0x01 + sequence, stored reversed in both
+        # base blocks: checksum base is nonce + len(payload), keystream base
+        # is 0x00 + nonce. ECB lets one call encrypt both.
+        reversed_nonce = s[::-1] + b'\x01' + self.nonce_prefix(address)[::-1]
+        bases = self._bases
+        bases[8:16] = reversed_nonce
+        bases[23:31] = reversed_nonce
+
+        plain = self._plain
+        n = len(data)
+        struct.pack_into("<HBBB", plain, 0, dest_id, command, 0x60, 0x01)
+        plain[5:5 + n] = data
+        plain[5 + n:16] = _ZERO_BLOCK[5 + n:16]
+        plain_int = int.from_bytes(plain, 'little')
+
+        encrypt = self._cipher.encrypt
+        encrypted_bases = encrypt(bases)
+        check = encrypt(
+            (int.from_bytes(encrypted_bases[0:16], 'big') ^ plain_int).to_bytes(16, 'big')
+        )
+        encrypted = (int.from_bytes(encrypted_bases[16:32], 'big') ^ plain_int).to_bytes(16, 'little')
+
+        packet = self._packet
+        packet[0:3] = s
+        packet[3] = check[15]
+        packet[4] = check[14]
+        packet[5:20] = memoryview(encrypted)[0:15]
+        return packet
@@ -0,0 +1,82 @@
+"""Platform for scenes saved on the AwoX lights."""
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from homeassistant.components.scene import Scene
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+from .scenes import AwoxSceneManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities
+) -> None:
+    """Set up a scene entity per scene saved on the lights."""
+    mesh = hass.data[DOMAIN][entry.entry_id]
+    known: set[str] = set()
+
+    @callback
+    def async_add_new_scenes(scenes: dict[str, dict]) -> None:
+        """Add entities for the scenes not seen yet."""
+        entities = []
+        for scene_id, record in scenes.items():
+            if scene_id in known:
+                continue
+            known.add(scene_id)
+            _LOGGER.info(" :: Setup scene [%d] %s", record["slot"], record["name"])
+            entities.append(AwoxScene(mesh.scenes, entry.entry_id, scene_id, record["name"]))
+
+        if entities:
+            async_add_entities(entities)
+
+    async_add_new_scenes(mesh.scenes.scenes)
+    entry.async_on_unload(mesh.scenes.async_subscribe(async_add_new_scenes))
+
+
+class AwoxScene(Scene):
+    """A Home Assistant scene recalled from the lights' scene slots."""
+
+    _attr_should_poll = False
+    _attr_icon = "mdi:palette"
+
+    def __init__(self, manager: AwoxSceneManager, entry_id: str, scene_id: str, name: str) -> None:
+        """Initialize the scene saved from scene_id."""
+        self._manager = manager
+        self._scene_id = scene_id
+
+        self._attr_name = f"{name} (mesh)"
+        self._attr_unique_id = f"awoxmesh-{entry_id}-scene-{scene_id}"
+
+    @property
+    def available(self) -> bool:
+        """Return true while the scene is saved on the lights."""
+        return self._scene_id in self._manager.scenes
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the slot and the lights holding the scene."""
+        record = self._manager.scenes.get(self._scene_id, {})
+        return {
+            "scene": self._scene_id,
+            "slot": record.get("slot"),
+            "mesh_ids": sorted(int(mesh_id) for mesh_id in record.get("lights", {})),
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Follow syncs, which may clear the scene."""
+        self.async_on_remove(self._manager.async_subscribe(self._handle_sync))
+
+    @callback
+    def _handle_sync(self, scenes: dict[str, dict]) -> None:
+        self.async_write_ha_state()
+
+    async def async_activate(self, **kwargs: Any) -> None:
+        """Recall the scene on every light at once."""
+        _LOGGER.info("Recall scene...%s", self._scene_id)
+        await self._manager.async_recall(self._scene_id)
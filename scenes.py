@@ -0,0 +1,234 @@
+"""Home Assistant scenes saved in the scene slots of the mesh nodes."""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from homeassistant.components.homeassistant.scene import DATA_PLATFORM
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_MODE,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_HS_COLOR,
+    ATTR_RGB_COLOR,
+    ColorMode,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import STATE_ON
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
+from homeassistant.util import color as color_util
+
+from .awox import AwoxMeshLight
+from .const import DOMAIN
+from .light import _color_brightness, _white_brightness, _white_temperature
+from .protocol import (
+    BROADCAST_MESH_ID,
+    encode_scene_delete,
+    encode_scene_recall,
+    encode_scene_store,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+# Scene slots of a node, the same slot holds a scene on every light so
+# one broadcast recalls it
+SCENE_SLOTS = range(1, 17)
+
+# White temperature saved when the scene does not set one
+DEFAULT_WHITE_TEMPERATURE = 0x40
+
+
+def scene_settings(state: State) -> list[int]:
+    """Return the slot values for a light state of a scene.
+
+    [on, color mode, white brightness, white temperature, color
+    brightness, red, green, blue], as encode_scene_store takes them.
+    """
+    # Scene editor snapshots store unset attributes as None
+    attributes = {key: value for key, value in state.attributes.items() if value is not None}
+    brightness = attributes.get(ATTR_BRIGHTNESS, 255)
+
+    rgb = attributes.get(ATTR_RGB_COLOR)
+    if rgb is None and ATTR_HS_COLOR in attributes:
+        rgb = color_util.color_hs_to_RGB(*attributes[ATTR_HS_COLOR])
+
+    kelvin = attributes.get(ATTR_COLOR_TEMP_KELVIN)
+    white_temp = DEFAULT_WHITE_TEMPERATURE if kelvin is None else _white_temperature(kelvin)
+
+    if ATTR_COLOR_MODE in attributes:
+        color_mode = attributes[ATTR_COLOR_MODE] not in (ColorMode.COLOR_TEMP, ColorMode.WHITE)
+        color_mode = color_mode and rgb is not None
+    else:
+        color_mode = rgb is not None and kelvin is None
+
+    return [
+        int(state.state == STATE_ON),
+        int(color_mode),
+        _white_brightness(brightness),
+        white_temp,
+        _color_brightness(brightness),
+        *(int(channel) for channel in (rgb or (255, 255, 255))),
+    ]
+
+
+class AwoxSceneManager:
+    """Keep Home Assistant scenes in the scene slots of the lights.
+
+    Each scene touching AwoX lights gets a slot, written once on every
+    light of the scene. Recalling it is then one broadcast packet. What
+    each light holds is stored, so a sync only writes the lights whose
+    settings changed and clears those that left the scene.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, mesh: AwoxMeshLight) -> None:
+        self._hass = hass
+        self._entry = entry
+        self._mesh = mesh
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.scenes.{entry.entry_id}")
+        self._lock = asyncio.Lock()
+        self._listeners: list = []
+
+        # Scene entity id -> {"name", "slot", "lights": {mesh id: settings}},
+        # mesh ids are strings as stored on disk
+        self.scenes: dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        """Read the saved slots from disk."""
+        data = await self._store.async_load()
+        if data:
+            self.scenes = data.get("scenes", {})
+
+    def async_subscribe(self, listener) -> callable:
+        """Call listener with the scenes whenever they change.
+
+        Returns a function that removes the listener.
+        """
+        self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            self._listeners.remove(listener)
+
+        return unsubscribe
+
+    async def async_recall(self, scene_id: str) -> bool:
+        """Apply a saved scene on every light, with one packet."""
+        slot = self.scenes[scene_id]["slot"]
+        return await self._mesh.async_send_command(*encode_scene_recall(slot), BROADCAST_MESH_ID)
+
+    def _light_mesh_ids(self) -> dict[str, set[int]]:
+        """Return the mesh ids behind each light entity of the entry."""
+        rooms = {group["room_id"]: set(group["provisioned"]) for group in self._mesh.group_entries}
+        room_prefix = f"awoxmesh-{self._entry.entry_id}-room-"
+        lights = {}
+
+        for entity in er.async_entries_for_config_entry(er.async_get(self._hass), self._entry.entry_id):
+            if entity.domain != "light":
+                continue
+            if entity.unique_id.startswith(room_prefix):
+                lights[entity.entity_id] = rooms.get(entity.unique_id[len(room_prefix):], set())
+            else:
+                lights[entity.entity_id] = {int(entity.unique_id.rsplit("-", 1)[1])}
+
+        return lights
+
+    def _scene_targets(self) -> dict[str, tuple[str, dict[int, list[int]]]]:
+        """Return the (name, settings per mesh id) of the scenes with AwoX lights."""
+        platform = self._hass.data.get(DATA_PLATFORM)
+        if platform is None:
+            return {}
+
+        lights = self._light_mesh_ids()
+        targets = {}
+
+        for scene_id, scene in platform.entities.items():
+            settings = {}
+            for entity_id, state in scene.scene_config.states.items():
+                for mesh_id in lights.get(entity_id, ()):
+                    settings[mesh_id] = scene_settings(state)
+            if settings:
+                targets[scene_id] = (scene.scene_config.name, settings)
+
+        return targets
+
+    async def async_sync(self, scene_ids: list[str] | None = None, force: bool = False) -> None:
+        """Write the scenes into the lights, all of them when scene_ids is None.
+
+        Scenes gone from Home Assistant, or without AwoX lights anymore,
+        are cleared and their slot freed. Lights out of reach are written
+        on a later sync. A written slot only proves the gateway got it, so
+        force writes every light in reach again, changed or not.
+        """
+        async with self._lock:
+            targets = self._scene_targets()
+            wanted = set(targets) | set(self.scenes)
+            if scene_ids is not None:
+                wanted &= set(scene_ids)
+
+            used = {record["slot"] for record in self.scenes.values()}
+            commands: dict[int, list[tuple[int, bytes]]] = {}
+            # What each command changes: (record, mesh id, settings or None)
+            edits: dict[int, list[tuple[dict, str, list[int] | None]]] = {}
+
+            def edit(record: dict, mesh_id: int, settings: list[int] | None) -> None:
+                if settings is None:
+                    command = encode_scene_delete(record["slot"])
+                else:
+                    command = encode_scene_store(record["slot"], *settings)
+                commands.setdefault(mesh_id, []).append(command)
+                edits.setdefault(mesh_id, []).append((record, str(mesh_id), settings))
+
+            for scene_id in sorted(wanted):
+                name, settings = targets.get(scene_id, (None, {}))
+                record = self.scenes.get(scene_id)
+
+                if record is None:
+                    slot = next((s for s in SCENE_SLOTS if s not in used), None)
+                    if slot is None:
+                        _LOGGER.warning("No scene slot left on the lights for %s", scene_id)
+                        continue
+                    used.add(slot)
+                    record = self.scenes[scene_id] = {"name": name, "slot": slot, "lights": {}}
+                elif name is not None:
+                    record["name"] = name
+
+                for mesh_id, values in settings.items():
+                    changed = force or record["lights"].get(str(mesh_id)) != values
+                    if changed and self._mesh.is_available(mesh_id):
+                        edit(record, mesh_id, values)
+
+                for key in list(record["lights"]):
+                    mesh_id = int(key)
+                    if mesh_id in settings:
+                        continue
+                    if self._mesh.node(mesh_id) is None:
+                        del record["lights"][key]
+                    elif self._mesh.is_available(mesh_id):
+                        edit(record, mesh_id, None)
+
+            if commands:
+                _LOGGER.debug("Writing %d scene slots", sum(map(len, commands.values())))
+
+            results = await self._mesh.async_queue_each(commands)
+
+            for mesh_id, node_edits in edits.items():
+                for (record, key, settings), resp in zip(node_edits, results[mesh_id]):
+                    if not resp:
+                        continue
+                    if settings is None:
+                        record["lights"].pop(key, None)
+                    else:
+                        record["lights"][key] = settings
+
+            for scene_id in sorted(wanted):
+                record = self.scenes.get(scene_id)
+                if record is not None and scene_id not in targets and not record["lights"]:
+                    del self.scenes[scene_id]
+
+            await self._store.async_save({"scenes": self.scenes})
+
+        for listener in list(self._listeners):
+            listener(self.scenes)
@@ -0,0 +1,145 @@
+"""Diagnostic sensors of the AwoX mesh link."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant
+
+from .awox import AwoxMeshLight
+from .const import DOMAIN
+
+# Metrics are cheap to read, no need to push every change
+SCAN_INTERVAL = timedelta(seconds=60)
+
+
+@dataclass(frozen=True, kw_only=True)
+class AwoxSensorEntityDescription(SensorEntityDescription):
+    """Describe an AwoX hub sensor."""
+
+    value_fn: Callable[[AwoxMeshLight], Any]
+    timing: str | None = None
+
+
+def _counter(name: str) -> Callable[[AwoxMeshLight], int]:
+    return lambda mesh: mesh.metrics.counters.get(name, 0)
+
+
+def _mean(name: str) -> Callable[[AwoxMeshLight], float | None]:
+    def value(mesh: AwoxMeshLight) -> float | None:
+        histogram = mesh.metrics.histograms.get(name)
+        if histogram is None or histogram.mean is None:
+            return None
+        return round(histogram.mean, 1)
+
+    return value
+
+
+SENSORS: tuple[AwoxSensorEntityDescription, ...] = (
+    AwoxSensorEntityDescription(
+        key="connects",
+        name="Connects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("connects"),
+    ),
+    AwoxSensorEntityDescription(
+        key="reconnects",
+        name="Reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("reconnects"),
+    ),
+    AwoxSensorEntityDescription(
+        key="failovers",
+        name="Failovers",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda mesh: mesh.failovers,
+    ),
+    AwoxSensorEntityDescription(
+        key="auth_failures",
+        name="Auth failures",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("auth_failures"),
+    ),
+    AwoxSensorEntityDescription(
+        key="bytes_written",
+        name="Bytes written",
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=_counter("bytes_written"),
+    ),
+    AwoxSensorEntityDescription(
+        key="queue_depth",
+        name="Queue depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda mesh: mesh.queue_depth,
+    ),
+    AwoxSensorEntityDescription(
+        key="connect_time",
+        name="Connect time",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_mean("connect"),
+        timing="connect",
+    ),
+    AwoxSensorEntityDescription(
+        key="write_time",
+        name="Write time",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_mean("write"),
+        timing="write",
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities
+) -> None:
+    """Set up the diagnostic sensors of a config entry."""
+    mesh = hass.data[DOMAIN][entry.entry_id]
+
+    async_add_entities(
+        AwoxHubSensor(mesh, entry.entry_id, description) for description in SENSORS
+    )
+
+
+class AwoxHubSensor(SensorEntity):
+    """A counter or timing of the mesh link, read from the hub metrics."""
+
+    entity_description: AwoxSensorEntityDescription
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self, mesh: AwoxMeshLight, entry_id: str, description: AwoxSensorEntityDescription
+    ) -> None:
+        """Initialize the sensor."""
+        self._mesh = mesh
+        self.entity_description = description
+        self._attr_unique_id = f"awoxmesh-{entry_id}-{description.key}"
+        self._attr_name = f"AwoX mesh {description.name.lower()}"
+
+    @property
+    def native_value(self) -> Any:
+        """Return the current value of the metric."""
+        return self.entity_description.value_fn(self._mesh)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the histogram of timing sensors."""
+        if self.entity_description.timing is None:
+            return None
+        histogram = self._mesh.metrics.histograms.get(self.entity_description.timing)
+        if histogram is None:
+            return None
+        return histogram.as_dict()
@@ -0,0 +1,92 @@
+"""Shared setup of the tests.
+
+The repository root is the integration package itself. With Home
+Assistant installed it is registered here as the awox package, for the
+tests of the hub and its helpers; without it only the protocol tests run.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MESH_NAME = "test"
+MESH_PASSWORD = "1234"
+GATEWAY_MAC = "A4:C1:38:00:00:01"
+LIGHTS = [1, 2, 3, 4]
+
+
+def _register_integration() -> None:
+    spec = importlib.util.spec_from_file_location(
+        "awox", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["awox"] = module
+    try:
+        spec.loader.exec_module(module)
+    except ImportError:
+        del sys.modules["awox"]
+
+
+_register_integration()
+
+
+class FakeHass:
+    """The few HomeAssistant members the hub uses outside of async_start."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+
+    def async_create_task(self, coro):
+        return self.loop.create_task(coro)
+
+    def async_create_background_task(self, coro, name):
+        return self.loop.create_task(coro, name=name)
+
+
+async def _make_hub(**options):
+    """Return a hub and the gateway node of a simulated mesh of LIGHTS.
+
+    options are set on the hub, e.g. write_without_response. Every light
+    counts as heard and the session is connected.
+    """
+    from awox.awox import AwoxMeshLight
+    from awox.bench.fake_mesh import FakeMeshNode, fake_connector
+
+    node = FakeMeshNode(GATEWAY_MAC, MESH_NAME, MESH_PASSWORD, LIGHTS)
+    devices = [
+        {
+            "mesh_id": mesh_id,
+            "mac": GATEWAY_MAC if mesh_id == 1 else f"A4:C1:38:00:00:{mesh_id:02X}",
+            "name": f"light {mesh_id}",
+            "type": ".ble.tlmesh.light.switch.color.white.dimming.temperature.",
+        }
+        for mesh_id in LIGHTS
+    ]
+    hub = AwoxMeshLight(
+        FakeHass(), MESH_NAME, MESH_PASSWORD, "", devices, 0.0, fake_connector({GATEWAY_MAC: node})
+    )
+    for name, value in options.items():
+        setattr(hub, name, value)
+    hub.node(1).update_from_advertisement(
+        SimpleNamespace(device=SimpleNamespace(address=GATEWAY_MAC), rssi=-60, time=time.monotonic())
+    )
+    for mesh_id in LIGHTS:
+        hub.node(mesh_id).last_status = time.monotonic()
+
+    assert await hub._session.async_ensure_connected()
+    return hub, node
+
+
+@pytest.fixture
+def make_hub():
+    """Return the coroutine function building a hub on a simulated mesh."""
+    pytest.importorskip("awox.awox")
+    return _make_hub
@@ -0,0 +1,54 @@
+"""Mesh group provisioning, driven through the simulated mesh of the bench."""
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+groups = pytest.importorskip("awox.groups")
+
+from awox.const import CONF_GROUPS  # noqa: E402
+from homeassistant.const import CONF_DEVICES  # noqa: E402
+
+
+class FakeEntry:
+    """The config entry members provisioning uses."""
+
+    def __init__(self, data: dict) -> None:
+        self.data = data
+
+    def async_create_background_task(self, hass, coro, name):
+        return hass.async_create_background_task(coro, name)
+
+
+def test_node_heard_later_joins(make_hub):
+    """A node out of reach at the first run joins once it reports a status."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        hub.node(3).last_status = time.monotonic() - 1000
+        entry = FakeEntry({
+            CONF_DEVICES: [{"mesh_id": mesh_id, "type": "light", "room_id": "a"} for mesh_id in node.lights],
+        })
+
+        def async_update_entry(entry, data):
+            entry.data = data
+
+        hub.hass.config_entries = SimpleNamespace(async_update_entry=async_update_entry)
+        provisioner = groups.AwoxGroupProvisioner(hub.hass, entry, hub)
+
+        await provisioner.async_provision()
+        assert entry.data[CONF_GROUPS][0]["provisioned"] == [1, 2, 4]
+        assert not node.lights[3].groups
+
+        node._send_status(node.lights[3])
+        await asyncio.sleep(0.1)
+
+        assert entry.data[CONF_GROUPS][0]["provisioned"] == [1, 2, 3, 4]
+        assert node.lights[3].groups == {groups.GROUP_ADDRESS_START}
+        provisioner.async_stop()
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
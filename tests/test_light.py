@@ -0,0 +1,44 @@
+"""Light entities sending their requests to the simulated mesh."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+light = pytest.importorskip("awox.light")
+
+from homeassistant.components.light import ATTR_EFFECT, ColorMode  # noqa: E402
+
+COLOR_MODES = {ColorMode.RGB, ColorMode.COLOR_TEMP}
+
+
+def make_light(hub, mesh_id: int) -> light.AwoxLight:
+    entity = light.AwoxLight(hub, "", mesh_id, f"light {mesh_id}", COLOR_MODES, None, None, None)
+    entity.async_write_ha_state = lambda: None
+    return entity
+
+
+def test_effect_list_has_presets():
+    entity = light.AwoxLight(None, "", 1, "light", COLOR_MODES, None, None, None)
+    assert set(light.PRESET_EFFECTS) <= set(entity.effect_list)
+
+    white = light.AwoxLight(None, "", 1, "light", {ColorMode.COLOR_TEMP}, None, None, None)
+    assert not set(light.PRESET_EFFECTS) & set(white.effect_list)
+
+
+def test_turn_on_preset(make_hub):
+    """A preset effect powers the light on and starts the firmware sequence."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        entity = make_light(hub, 2)
+
+        await entity.async_turn_on(**{ATTR_EFFECT: "Preset 3"})
+
+        assert node.lights[2].on
+        assert node.lights[2].preset == 2
+        assert entity.effect == "Preset 3"
+        assert entity.color_mode == ColorMode.RGB
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
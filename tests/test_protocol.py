@@ -0,0 +1,122 @@
+"""AwoxSessionCrypto against the module level packet helpers of protocol.py."""
+from __future__ import annotations
+
+import importlib.util
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("Crypto.Cipher.AES")
+
+PROTOCOL_PATH = Path(__file__).resolve().parent.parent / "protocol.py"
+
+
+def _load_protocol():
+    """Import protocol.py on its own, without the integration package."""
+    spec = importlib.util.spec_from_file_location("awox_protocol", PROTOCOL_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+protocol = _load_protocol()
+
+ROUNDS = 50
+
+
+def _random_case(rng: random.Random) -> tuple[bytes, str, bytes]:
+    """Return a random session key, MAC address and 3 byte sequence."""
+    key = rng.randbytes(16)
+    mac = ":".join(f"{byte:02X}" for byte in rng.randbytes(6))
+    return key, mac, rng.randbytes(3)
+
+
+def _decrypt_packet(key: bytes, address: str, packet: bytes) -> bytearray | None:
+    """Decrypt a notification with the module level helpers."""
+    a = bytearray.fromhex(address.replace(":", ""))
+    a.reverse()
+    nonce = bytes(a[0:3]) + bytes(packet[0:5])
+
+    result = protocol.crypt_payload(key, nonce, packet[7:])
+    if protocol.make_checksum(key, nonce, result)[0:2] != packet[5:7]:
+        return None
+    return bytearray(packet[0:7]) + result
+
+
+def test_imports_without_home_assistant():
+    """protocol.py must stay usable outside Home Assistant."""
+    code = (
+        "import importlib.util, sys;"
+        f"spec = importlib.util.spec_from_file_location('p', {str(PROTOCOL_PATH)!r});"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec));"
+        "assert not any(m.split('.')[0] in ('homeassistant', 'bleak') for m in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+@pytest.mark.parametrize("length", range(0, 14))
+def test_make_command_packet(monkeypatch, length):
+    rng = random.Random(length)
+    for _ in range(ROUNDS):
+        key, mac, sequence = _random_case(rng)
+        dest_id = rng.randrange(0x10000)
+        command = rng.randrange(0x100)
+        data = rng.randbytes(length)
+
+        monkeypatch.setattr(protocol, "urandom", lambda n: sequence)
+        expected = protocol.make_command_packet(key, mac, dest_id, command, data)
+        session = protocol.AwoxSessionCrypto(key)
+
+        assert session.make_command_packet(mac, dest_id, command, data, sequence) == expected
+
+
+def test_make_command_packet_session_sequence():
+    rng = random.Random(0)
+    key, mac, _ = _random_case(rng)
+    session = protocol.AwoxSessionCrypto(key)
+
+    for _ in range(ROUNDS):
+        packet = bytes(session.make_command_packet(mac, 0xFFFF, protocol.C_POWER, b"\x01"))
+        sequence = session._sequence.to_bytes(3, "little")
+
+        assert packet[0:3] == sequence
+        assert packet == bytes(session.make_command_packet(mac, 0xFFFF, protocol.C_POWER, b"\x01", sequence))
+
+
+@pytest.mark.parametrize("length", [0, 1, 8, 15, 16, 17, 32, 33])
+def test_checksum_and_payload(length):
+    rng = random.Random(length)
+    for _ in range(ROUNDS):
+        key, _, _ = _random_case(rng)
+        nonce = rng.randbytes(8)
+        payload = rng.randbytes(length)
+        session = protocol.AwoxSessionCrypto(key)
+
+        assert session.make_checksum(nonce, payload) == protocol.make_checksum(key, nonce, payload)
+        assert session.crypt_payload(nonce, payload) == protocol.crypt_payload(key, nonce, payload)
+
+
+@pytest.mark.parametrize("length", range(0, 14))
+def test_decrypt_packet(length):
+    rng = random.Random(length)
+    for _ in range(ROUNDS):
+        key, mac, _ = _random_case(rng)
+        a = bytearray.fromhex(mac.replace(":", ""))
+        a.reverse()
+        head = rng.randbytes(5)
+        nonce = bytes(a[0:3]) + head
+        plain = rng.randbytes(length)
+
+        check = protocol.make_checksum(key, nonce, plain)
+        packet = head + bytes(check[0:2]) + bytes(protocol.crypt_payload(key, nonce, plain))
+        session = protocol.AwoxSessionCrypto(key)
+
+        assert session.decrypt_packet(mac, packet) == _decrypt_packet(key, mac, packet)
+        assert session.decrypt_packet(mac, packet) == bytearray(packet[0:7]) + plain
+
+        corrupt = packet[0:5] + bytes([packet[5] ^ 0xFF]) + packet[6:]
+        assert session.decrypt_packet(mac, corrupt) is None
+        assert _decrypt_packet(key, mac, corrupt) is None
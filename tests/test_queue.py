@@ -0,0 +1,163 @@
+"""The hub command queue, driven through the simulated mesh of the bench."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("awox.awox")
+
+from awox.awox import ACK_RETRIES  # noqa: E402
+from awox.effects import AwoxEffectEngine, colorloop_frame  # noqa: E402
+from awox.protocol import (  # noqa: E402
+    encode_color_brightness,
+    encode_group_edit,
+    encode_power,
+    encode_scene_store,
+)
+
+
+def test_last_write_wins(make_hub):
+    """Commands for the same light and attribute queued together send the newest only."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        received = node.packets_received
+
+        results = await asyncio.gather(
+            hub.async_send_command(*encode_color_brightness(0x20), 2),
+            hub.async_send_command(*encode_color_brightness(0x40), 2),
+            hub.async_send_command(*encode_power(True), 2),
+        )
+
+        assert results == [True, True, True]
+        assert node.packets_received - received == 2
+        assert node.lights[2].color_brightness == encode_color_brightness(0x40)[1][0]
+        assert node.lights[2].on
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_identical_fan_out_is_one_packet(make_hub):
+    """The same command for every light goes out as one broadcast."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        received = node.packets_received
+
+        results = await asyncio.gather(
+            *(hub.async_send_command(*encode_power(True), mesh_id) for mesh_id in node.lights)
+        )
+
+        assert all(results)
+        assert node.packets_received - received == 1
+        assert all(light.on for light in node.lights.values())
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_group_address_over_per_light_packets(make_hub):
+    """The lights of a provisioned group share a packet to its address."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        hub.async_update_groups([{"room_id": "a", "address": 0x8001, "members": [1, 2], "provisioned": [1, 2]}])
+        node.lights[1].groups.add(0x8001)
+        node.lights[2].groups.add(0x8001)
+        received = node.packets_received
+
+        results = await asyncio.gather(
+            *(hub.async_send_command(*encode_power(True), mesh_id) for mesh_id in (1, 2, 3))
+        )
+
+        assert all(results)
+        assert node.packets_received - received == 2
+        assert [light.on for light in node.lights.values()] == [True, True, True, False]
+        assert hub.resolve_destinations({1, 2, 3}) == [(0x8001, {1, 2}), (3, {3})]
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_unconfirmed_command_is_sent_again(make_hub):
+    """Without write response, a packet lost in the mesh is retried until a status confirms it."""
+
+    async def scenario():
+        hub, node = await make_hub(write_without_response=True)
+        hub.metrics.enabled = True
+        handle_command = node.handle_command
+
+        def drop_first(packet):
+            node.handle_command = handle_command
+            node.packets_received += 1
+            node.packets_dropped += 1
+
+        node.handle_command = drop_first
+        received = node.packets_received
+
+        assert await hub.async_send_command(*encode_color_brightness(0x30), 2)
+
+        assert node.packets_received - received == 2
+        assert hub.metrics.counters["retries"] == 1
+        assert node.lights[2].color_brightness == encode_color_brightness(0x30)[1][0]
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_unconfirmed_command_gives_up(make_hub):
+    """A light that never confirms fails the command after ACK_RETRIES resends."""
+
+    async def scenario():
+        hub, node = await make_hub(write_without_response=True)
+        node.drop_rate = 1.0
+        received = node.packets_received
+
+        assert not await hub.async_send_command(*encode_color_brightness(0x30), 2)
+
+        assert node.packets_received - received == 1 + ACK_RETRIES
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "command",
+    [encode_scene_store(1, 1, 0, 0x7F, 0x40, 0x64, 255, 255, 255), encode_group_edit(0x8001, True)],
+)
+def test_node_edits_use_node_addresses(make_hub, command):
+    """An edit queued for every light is not broadcast, remotes would hear it."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        received = node.packets_received
+
+        results = await hub.async_queue_each({mesh_id: [command] for mesh_id in node.lights})
+
+        assert results == {mesh_id: [True] for mesh_id in node.lights}
+        assert node.packets_received - received == len(node.lights)
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_command_stops_room_effect(make_hub):
+    """A light set on its own leaves the effect its room plays."""
+
+    async def scenario():
+        hub, node = await make_hub()
+        hub.effects = AwoxEffectEngine(hub.hass, hub)
+        hub.async_update_groups([{"room_id": "a", "address": 0x8001, "members": [1, 2], "provisioned": [1, 2]}])
+        hub.effects.start_effect(0x8001, colorloop_frame)
+        hub.effects.start_effect(3, colorloop_frame)
+
+        assert await hub.async_send_command(*encode_power(False), 2)
+
+        assert not hub.effects.is_playing(0x8001)
+        assert hub.effects.is_playing(3)
+        hub.effects.stop()
+        await hub.async_shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+"""Light states of Home Assistant scenes as saved in the scene slots."""
+from __future__ import annotations
+
+import pytest
+
+scenes = pytest.importorskip("awox.scenes")
+
+from homeassistant.components.light import ColorMode  # noqa: E402
+from homeassistant.core import State  # noqa: E402
+
+
+def test_scene_settings_none_attributes():
+    """Scene editor snapshots store the attributes a light does not use as None."""
+    state = State(
+        "light.kitchen",
+        "on",
+        {
+            "brightness": None,
+            "color_mode": None,
+            "color_temp_kelvin": None,
+            "hs_color": None,
+            "rgb_color": None,
+        },
+    )
+
+    assert scenes.scene_settings(state) == [
+        1, 0, 0x7F, scenes.DEFAULT_WHITE_TEMPERATURE, 0x64, 255, 255, 255
+    ]
+
+
+def test_scene_settings_rgb():
+    """RGB snapshots leave the color temperature as None."""
+    state = State(
+        "light.kitchen",
+        "on",
+        {
+            "brightness": 255,
+            "color_mode": ColorMode.RGB,
+            "color_temp_kelvin": None,
+            "hs_color": None,
+            "rgb_color": (255, 0, 0),
+        },
+    )
+
+    on, color_mode, _, _, color_brightness, *rgb = scenes.scene_settings(state)
+    assert (on, color_mode, color_brightness, rgb) == (1, 1, 0x64, [255, 0, 0])
+
+
+def test_scene_settings_white():
+    state = State(
+        "light.kitchen",
+        "on",
+        {"brightness": 0, "color_mode": ColorMode.COLOR_TEMP, "color_temp_kelvin": 2700, "rgb_color": None},
+    )
+
+    on, color_mode, white_brightness, _, _, *rgb = scenes.scene_settings(state)
+    assert (on, color_mode, white_brightness, rgb) == (1, 0, 0x01, [255, 255, 255])